@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Ограничения на одновременную работу агента
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Caps concurrent work at max_in_flight, lets at most max_queue callers wait for a slot
+    (each for no longer than queue_timeout) and rejects everyone else immediately with Overloaded.
+    Blocking functions run on a dedicated thread pool sized to max_in_flight, not the loop's default executor.
+    """
+
+    def __init__(self, name: str, max_in_flight=ADMISSION_MAX_IN_FLIGHT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "completed": 0,
+                      "wait_time_total": 0.0, "wait_time_max": 0.0, "queue_depth_max": 0}
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "in_flight": self.in_flight, "queue_depth": self.queue_depth,
+                "max_in_flight": self.max_in_flight, "max_queue": self.max_queue}
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._admit()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def run(self, make_coro):
+        async with self.slot():
+            return await make_coro()
+
+    async def run_in_executor(self, fn, *args):
+        # Поток не отменить: слот освобождается, когда функция действительно вернётся, а не когда
+        # ожидающего отменили по таймауту, иначе лишние вызовы копились бы в очереди пула
+        await self._admit()
+        self.in_flight += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._finished)
+        return await asyncio.shield(future)
+
+    def _finished(self, future):
+        if not future.cancelled():
+            # Исключение получит ожидающий; если его уже отменили, asyncio не пишет его в лог
+            future.exception()
+        self._release()
+
+    def _release(self):
+        self.in_flight -= 1
+        self.stats["completed"] += 1
+        self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _admit(self):
+        if not self._slots.locked():
+            # Свободный слот есть и очереди нет — acquire завершится без ожидания
+            await self._slots.acquire()
+            self.stats["admitted"] += 1
+            return
+        if self.queue_depth >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded(f"{self.name} is overloaded: {self.in_flight} in flight, {self.queue_depth} queued",
+                             retry_after=self.queue_timeout)
+        self.queue_depth += 1
+        self.stats["queue_depth_max"] = max(self.stats["queue_depth_max"], self.queue_depth)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise Overloaded(f"{self.name} is overloaded: waited {self.queue_timeout}s for a slot",
+                             retry_after=self.queue_timeout)
+        finally:
+            self.queue_depth -= 1
+            waited = time.perf_counter() - start
+            self.stats["wait_time_total"] += waited
+            self.stats["wait_time_max"] = max(self.stats["wait_time_max"], waited)
+        self.stats["admitted"] += 1
@@ -0,0 +1,230 @@
+import asyncio
+import functools
+import os
+import re
+import time
+from collections import OrderedDict
+from resilience import detach
+
+# Настройки кэша ответов Q&A агента
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "10000"))
+ANSWER_CACHE_EMBEDDING_MODEL = os.getenv("ANSWER_CACHE_EMBEDDING_MODEL")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+# Эмбеддинг — лишь ускорение: не успел за столько секунд или упал — считаем ответ без поиска похожих
+ANSWER_CACHE_EMBED_TIMEOUT = float(os.getenv("ANSWER_CACHE_EMBED_TIMEOUT", "2"))
+# Начальное число строк матрицы эмбеддингов; растёт удвоением до ANSWER_CACHE_SIZE
+_INITIAL_ROWS = 64
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize_query(query: str) -> str:
+    # "Что такое OnaiTabu?!" и "что такое onaitabu" дают один ключ
+    return " ".join(_NON_WORD.sub(" ", query.lower().replace("ё", "е")).split())
+
+def _unit(embedding):
+    import numpy as np  # нужен только с эмбеддингами
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def openai_embedder(model: str):
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI()
+
+    async def embed(text: str) -> list[float]:
+        response = await client.embeddings.create(model=model, input=text)
+        return response.data[0].embedding
+    return embed
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "latency", "row")
+
+    def __init__(self, value, expires_at, latency, row):
+        self.value = value
+        self.expires_at = expires_at
+        self.latency = latency
+        self.row = row  # строка в матрице эмбеддингов или None
+
+class AnswerCache:
+    """
+    LRU/TTL cache of agent answers keyed by document version and normalized query.
+
+    Concurrent misses for the same key are coalesced into one computation that runs as its own task,
+    outside any caller's deadline; callers bound their own wait (e.g. within(..., cache.get_or_compute(...))).
+    With an embed function, a miss on the exact key falls back to the most similar cached query
+    above similarity_threshold, found with one matrix-vector product over unit-length embeddings.
+    """
+
+    def __init__(self, version=None, ttl=ANSWER_CACHE_TTL, max_size=ANSWER_CACHE_SIZE, embed=None,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY, embed_timeout=ANSWER_CACHE_EMBED_TIMEOUT):
+        self.version = version
+        self.ttl = ttl
+        self.max_size = max_size
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.embed_timeout = embed_timeout
+        self._entries = OrderedDict()  # (version, normalized query) -> _Entry
+        self._inflight = {}  # key -> asyncio.Task
+        self._vectors = None  # numpy-матрица единичных эмбеддингов, строка на запись
+        self._row_keys = []  # строка -> ключ записи (None — строка свободна)
+        self._free_rows = []
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "embed_failures": 0,
+                      "saved_latency": 0.0, "compute_latency": 0.0}
+
+    def set_version(self, version):
+        # Версия входит в ключ: ответы по старому PDF больше не находятся и вытесняются LRU.
+        # Только присваивание, поэтому безопасно вызывать из потока, где собирается агент
+        self.version = version
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["hits"] + self.stats["similar_hits"] + self.stats["coalesced"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "size": len(self._entries), "inflight": len(self._inflight),
+                "hit_ratio": self.hit_ratio(), "version": self.version}
+
+    def get(self, query: str):
+        entry = self._lookup(self._key(query))
+        if entry is None:
+            return None
+        self.stats["hits"] += 1
+        self.stats["saved_latency"] += entry.latency
+        return entry.value
+
+    def put(self, query: str, value, latency: float):
+        self.stats["misses"] += 1
+        self.stats["compute_latency"] += latency
+        self._store(self._key(query), value, latency, None)
+
+    async def get_or_compute(self, query: str, compute):
+        key = self._key(query)
+        entry = self._lookup(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self.stats["saved_latency"] += entry.latency
+            return entry.value
+
+        while True:
+            task = self._inflight.get(key)
+            if task is None:
+                # Общее вычисление идёт без срока запроса, который его начал: иначе короткий срок первого
+                # вызывающего обрывал бы его для всех. Свой срок каждый вызывающий применяет к ожиданию снаружи
+                task = detach(self._compute(key, compute))
+                task.add_done_callback(functools.partial(self._computed, key))
+                self._inflight[key] = task
+            else:
+                self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Отменено само вычисление, а не этот вызов — запускаем заново
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+    async def _compute(self, key, compute):
+        try:
+            embedding = None
+            if self.embed is not None:
+                embedding = await self._embed(key[1])
+                entry = self._lookup_similar(key[0], embedding) if embedding is not None else None
+                if entry is not None:
+                    self.stats["similar_hits"] += 1
+                    self.stats["saved_latency"] += entry.latency
+                    return entry.value
+
+            self.stats["misses"] += 1
+            start = time.perf_counter()
+            value = await compute()
+            latency = time.perf_counter() - start
+            self.stats["compute_latency"] += latency
+            self._store(key, value, latency, embedding)
+            return value
+        except BaseException:
+            self.stats["errors"] += 1
+            raise
+
+    async def _embed(self, text):
+        try:
+            return await asyncio.wait_for(self.embed(text), self.embed_timeout)
+        except Exception:
+            # Таймаут, квота или сеть: ответ всё равно считаем, только без поиска похожих и без эмбеддинга в записи
+            self.stats["embed_failures"] += 1
+            return None
+
+    def _computed(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Помечаем исключение как полученное, иначе asyncio пишет в лог, если ожидающих не было
+            task.exception()
+
+    def _key(self, query: str) -> tuple:
+        return self.version, normalize_query(query)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _lookup_similar(self, version, embedding):
+        if self._vectors is None:
+            return None
+        import numpy as np
+        used = len(self._row_keys)
+        scores = self._vectors[:used] @ _unit(embedding)
+        candidates = np.flatnonzero(scores >= self.similarity_threshold)
+        now = time.monotonic()
+        for row in candidates[np.argsort(scores[candidates])[::-1]]:
+            key = self._row_keys[row]
+            if key is None or key[0] != version:
+                continue
+            if self._entries[key].expires_at <= now:
+                self._drop(key)
+                continue
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        return None
+
+    def _store(self, key, value, latency, embedding):
+        previous = self._entries.get(key)
+        if previous is not None:
+            self._drop(key)
+        row = self._add_vector(key, embedding) if embedding is not None else None
+        self._entries[key] = _Entry(value, time.monotonic() + self.ttl, latency, row)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def _add_vector(self, key, embedding) -> int:
+        import numpy as np
+        vector = _unit(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros((min(_INITIAL_ROWS, self.max_size + 1), len(vector)), dtype=np.float32)
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_keys[row] = key
+        else:
+            row = len(self._row_keys)
+            self._row_keys.append(key)
+            if row == len(self._vectors):
+                grown = np.zeros((min(2 * row, self.max_size + 1), self._vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self._vectors
+                self._vectors = grown
+        self._vectors[row] = vector
+        return row
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        if entry.row is not None:
+            # Нулевая строка никогда не проходит порог сходства
+            self._vectors[entry.row] = 0
+            self._row_keys[entry.row] = None
+            self._free_rows.append(entry.row)
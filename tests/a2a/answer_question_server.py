@@ -1,27 +1,147 @@
 import os
-from a2a.types import AgentCard, AgentSkill, AgentCapabilities, Message, MessageSendParams, Task, Role, Part, TextPart
+import time
+import uuid
+from contextlib import asynccontextmanager
+from a2a.types import AgentCard, AgentSkill, AgentCapabilities, Message, MessageSendParams, Task, Role, Part, TextPart, JSONRPCError
 from a2a.server.request_handlers.request_handler import RequestHandler
+from a2a.utils.errors import ServerError
 from a2a.server.apps import A2AStarletteApplication
-import uvicorn
-from question_answer import AppAgentDeps, setup_vector_store, build_agent
-import asyncio
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from question_answer import AppAgentDeps, file_sha256, setup_agent, stream_answer
+from answer_cache import AnswerCache, openai_embedder, ANSWER_CACHE_EMBEDDING_MODEL
+from admission import AdmissionController, Overloaded
+from metrics import REGISTRY, metrics_route, span, in_flight, trace, trace_id_from
+from serving import Lazy, Readiness, serve
+from resilience import (
+    DEADLINE_EXCEEDED_ERROR_CODE, UNAVAILABLE_ERROR_CODE, CircuitBreaker, CircuitOpen, DeadlineExceeded,
+    budget, cut_by_deadline, deadline, deadline_from, within,
+)
+
+# "async" — нативный agent.run в event loop, "thread" — run_sync в выделенном пуле потоков
+QA_AGENT_MODE = os.getenv("QA_AGENT_MODE", "thread")
+# Верхняя граница одного вызова модели; срок запроса может урезать её
+QA_AGENT_TIMEOUT = float(os.getenv("QA_AGENT_TIMEOUT", "60"))
+
+# JSON-RPC код ошибки для отказа при перегрузке (аналог HTTP 429)
+OVERLOADED_ERROR_CODE = -32029
 
-# Инициализация агента один раз при старте сервера
 _deps = AppAgentDeps()
-_deps = setup_vector_store(_deps)
-_agent = build_agent(_deps.vector_store_id)
+_deps.pdf_sha256 = file_sha256(_deps.pdf_path)
+
+# Кэш ответов привязан к версии PDF (sha256), опционально с поиском похожих вопросов по эмбеддингам
+_cache = AnswerCache(
+    version=_deps.pdf_sha256,
+    embed=openai_embedder(ANSWER_CACHE_EMBEDDING_MODEL) if ANSWER_CACHE_EMBEDDING_MODEL else None,
+)
+
+def _build_agent():
+    agent = setup_agent(_deps)
+    # setup_agent заново хэширует PDF: ответы по прежней версии документа больше не отдаются
+    _cache.set_version(_deps.pdf_sha256)
+    return agent
+
+# Агент (pydantic_ai, openai, vector store) собирается один раз при прогреве воркера или первом запросе, не при импорте
+_agent = Lazy(_build_agent)
+
+# Ограничение одновременных вызовов агента и очереди ожидания
+_admission = AdmissionController("qa-agent")
+
+# Статистика кэша и очереди тоже отдаётся в /metrics
+def _collect_stats():
+    for prefix, stats in (("onaitabu_qa_cache", _cache.snapshot()), ("onaitabu_qa_admission", _admission.snapshot())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}_{key}", {}, value
+
+REGISTRY.add_collector(_collect_stats)
+
+# При серии ошибок OpenAI запросы сразу получают отказ, а не занимают слоты агента
+_openai_breaker = CircuitBreaker("openai")
+
+async def _call_agent(query: str):
+    agent = await _agent.aget()
+    with _openai_breaker.guard():
+        return await within("openai", agent.run(query), QA_AGENT_TIMEOUT)
+
+def _call_agent_sync(query: str):
+    # В потоке вызов не отменить, поэтому остаток срока уходит таймаутом в сам клиент модели
+    agent = _agent.get()
+    with _openai_breaker.guard():
+        timeout = budget("openai", QA_AGENT_TIMEOUT)
+        start = time.monotonic()
+        try:
+            return agent.run_sync(query, model_settings={"timeout": timeout})
+        except Exception:
+            if time.monotonic() - start >= timeout and cut_by_deadline("openai", timeout, QA_AGENT_TIMEOUT):
+                raise DeadlineExceeded("Deadline exceeded while waiting for openai", timeout) from None
+            raise
+
+async def _run_agent(query: str):
+    # Общее для совпавших запросов вычисление (кэш запускает его без срока запроса): ограничено
+    # QA_AGENT_TIMEOUT и очередью admission, а слот держится, пока вызов модели действительно идёт
+    with span("qa", "agent_run"):
+        if QA_AGENT_MODE == "async":
+            result = await _admission.run(lambda: _call_agent(query))
+        else:
+            result = await _admission.run_in_executor(_call_agent_sync, query)
+    return result.output
 
 async def answer_question_logic(query: str) -> str:
-    loop = asyncio.get_running_loop()
-    result = await loop.run_in_executor(None, _agent.run_sync, query)
-    answer = result.output.answer
-    source = result.output.source
+    # Срок запроса ограничивает только его собственное ожидание; время в очереди admission тоже входит в него
+    with span("qa", "answer"):
+        output = await within("qa_agent", _cache.get_or_compute(query, lambda: _run_agent(query)))
+    answer = output.answer
+    source = output.source
     return f"{answer}\n(Источник: {source})"
 
+async def answer_question_stream(query: str):
+    # Ответ из кэша отдаём целиком, иначе — по мере генерации токенов моделью
+    output = _cache.get(query)
+    if output is None:
+        agent = await _agent.aget()
+        start = time.perf_counter()
+        with span("qa", "agent_stream"):
+            async with _admission.slot():
+                with _openai_breaker.guard():
+                    async for delta, final in stream_answer(agent, query):
+                        if final is not None:
+                            output = final
+                        elif delta:
+                            yield delta
+        _cache.put(query, output, time.perf_counter() - start)
+    else:
+        yield output.answer
+    yield f"\n(Источник: {output.source})"
+
+def _overloaded_error(e: Overloaded) -> ServerError:
+    return ServerError(error=JSONRPCError(
+        code=OVERLOADED_ERROR_CODE,
+        message=str(e),
+        data={"retry_after": e.retry_after},
+    ))
+
+def _resilience_error(e: Exception) -> ServerError:
+    if isinstance(e, CircuitOpen):
+        return ServerError(error=JSONRPCError(code=UNAVAILABLE_ERROR_CODE, message=str(e), data={"retry_after": e.retry_after}))
+    return ServerError(error=JSONRPCError(code=DEADLINE_EXCEEDED_ERROR_CODE, message=str(e)))
+
+async def cache_stats(request):
+    return JSONResponse(_cache.snapshot())
+
+async def admission_stats(request):
+    return JSONResponse(_admission.snapshot())
+
 class AnswerQuestionHandler(RequestHandler):
     async def on_message_send(self, params: MessageSendParams, context=None):
         user_message = params.message.parts[0].root.text
-        answer = await answer_question_logic(user_message)
+        try:
+            with trace(trace_id_from(params, context)), deadline(deadline_from(params, context)), in_flight("qa"):
+                answer = await answer_question_logic(user_message)
+        except Overloaded as e:
+            raise _overloaded_error(e)
+        except (DeadlineExceeded, CircuitOpen) as e:
+            raise _resilience_error(e)
         return Message(
             messageId="1",
             role=Role.agent,
@@ -33,7 +153,21 @@ class AnswerQuestionHandler(RequestHandler):
     async def on_cancel_task(self, params, context=None):
         return None
     async def on_message_send_stream(self, params, context=None):
-        return
+        user_message = params.message.parts[0].root.text
+        message_id = uuid.uuid4().hex
+        try:
+            with trace(trace_id_from(params, context)), deadline(deadline_from(params, context)), in_flight("qa"):
+                async for chunk in answer_question_stream(user_message):
+                    yield Message(
+                        messageId=message_id,
+                        role=Role.agent,
+                        parts=[Part(root=TextPart(text=chunk))],
+                        kind="message"
+                    )
+        except Overloaded as e:
+            raise _overloaded_error(e)
+        except (DeadlineExceeded, CircuitOpen) as e:
+            raise _resilience_error(e)
     async def on_set_task_push_notification_config(self, params, context=None):
         return None
     async def on_get_task_push_notification_config(self, params, context=None):
@@ -46,7 +180,7 @@ agent_card = AgentCard(
     description="Отвечает на вопросы по PDF",
     version="1.0",
     url="http://localhost:8001",
-    capabilities=AgentCapabilities(),
+    capabilities=AgentCapabilities(streaming=True),
     defaultInputModes=["text/plain"],
     defaultOutputModes=["text/plain"],
     skills=[
@@ -59,8 +193,29 @@ agent_card = AgentCard(
     ]
 )
 
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    _admission.shutdown()
+
+# Воркер принимает трафик, когда агент собран и очередь admission не заполнена
+readiness = Readiness(
+    "qa",
+    checks={"admission": lambda: _admission.queue_depth < _admission.max_queue},
+    warmup=_agent.get,
+    warmup_checks={"agent": lambda: _agent.ready},
+)
 handler = AnswerQuestionHandler()
-app = A2AStarletteApplication(agent_card=agent_card, http_handler=handler).build()
+app = A2AStarletteApplication(agent_card=agent_card, http_handler=handler).build(
+    lifespan=readiness.lifespan(lifespan),
+    routes=[
+        Route("/cache/stats", cache_stats, methods=["GET"]),
+        Route("/admission/stats", admission_stats, methods=["GET"]),
+        metrics_route,
+        readiness.route,
+    ],
+)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
+    # SERVER_WORKERS=auto — по воркеру на ядро
+    serve(app, "answer_question_server:app", port=8001)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+from a2a.server.context import ServerCallContext
+from a2a.types import MessageSendParams
+from a2a.utils.errors import ServerError
+from pydantic import ValidationError
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from resilience import deadline
+
+# Пакетные JSON-RPC запросы: сколько элементов обрабатывается одновременно (на процесс) и максимальный размер пакета
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+# С этим Accept ответы отдаются построчно (NDJSON) по мере готовности, а не одним массивом в конце
+BATCH_STREAM_MEDIA_TYPE = "application/x-ndjson"
+
+def _error(request_id, code: int, message: str, data=None) -> dict:
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+def _replay(body: bytes, receive):
+    # Уже прочитанное тело отдаём приложению заново, дальше — исходный receive (http.disconnect)
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return replay
+
+class JsonRpcBatch:
+    """
+    ASGI wrapper that answers JSON-RPC batch arrays of message/send calls posted to `path`. Items run
+    concurrently through handler.on_message_send (at most `concurrency` at a time across all batches)
+    and come back in request order, or one per line as they complete when the client accepts NDJSON.
+    Everything else, including single JSON-RPC requests, goes to the wrapped A2A app unchanged.
+    """
+
+    def __init__(self, app, handler, path: str = "/", concurrency=BATCH_CONCURRENCY, max_items=BATCH_MAX_ITEMS):
+        self.app = app
+        self.handler = handler
+        self.path = path
+        self.max_items = max_items
+        self._slots = asyncio.Semaphore(concurrency)
+        self.stats = {"requests": 0, "items": 0, "errors": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+        body = await _read_body(receive)
+        if body.lstrip()[:1] != b"[":
+            return await self.app(scope, _replay(body, receive), send)
+        response = await self.handle(Request(scope), body)
+        await response(scope, receive, send)
+
+    async def handle(self, request: Request, body: bytes) -> Response:
+        try:
+            items = json.loads(body)
+        except json.JSONDecodeError as e:
+            return JSONResponse(_error(None, -32700, f"Parse error: {e}"))
+        if not items:
+            return JSONResponse(_error(None, -32600, "Invalid Request: empty batch"))
+        if len(items) > self.max_items:
+            return JSONResponse(_error(None, -32600, f"Invalid Request: batch of {len(items)} exceeds {self.max_items} items"))
+        self.stats["requests"] += 1
+        self.stats["items"] += len(items)
+
+        context = ServerCallContext(state={"headers": dict(request.headers)})
+        # X-Deadline-Ms ограничивает весь пакет: задачи наследуют срок при создании
+        with deadline(_header_deadline(request)):
+            tasks = [asyncio.ensure_future(self._call(item, context)) for item in items]
+        if BATCH_STREAM_MEDIA_TYPE in request.headers.get("accept", ""):
+            return StreamingResponse(self._stream(tasks), media_type=BATCH_STREAM_MEDIA_TYPE)
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        # Уведомления (без id) выполняются, но ответа на них нет
+        responses = [result for result in results if result is not None]
+        return JSONResponse(responses) if responses else Response(status_code=204)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+    async def _stream(self, tasks):
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result is not None:
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            # Клиент отключился — недоделанные элементы пакета больше никому не нужны
+            for task in tasks:
+                task.cancel()
+
+    async def _call(self, item, context):
+        if not isinstance(item, dict) or item.get("jsonrpc") != "2.0" or not isinstance(item.get("method"), str):
+            self.stats["errors"] += 1
+            return _error(item.get("id") if isinstance(item, dict) else None, -32600, "Invalid Request")
+        request_id = item.get("id")
+        response = await self._dispatch(item, request_id, context)
+        if "error" in response:
+            self.stats["errors"] += 1
+        return response if "id" in item else None
+
+    async def _dispatch(self, item, request_id, context) -> dict:
+        if item["method"] != "message/send":
+            return _error(request_id, -32601, f"Method not found in batch: {item['method']} (only message/send)")
+        try:
+            params = MessageSendParams.model_validate(item.get("params"))
+        except ValidationError as e:
+            return _error(request_id, -32602, "Invalid params", json.loads(e.json()))
+        async with self._slots:
+            try:
+                result = await self.handler.on_message_send(params, context)
+            except ServerError as e:
+                error = e.error.model_dump(mode="json", exclude_none=True) if e.error else {"code": -32603, "message": str(e)}
+                return {"jsonrpc": "2.0", "id": request_id, "error": error}
+            except Exception as e:
+                return _error(request_id, -32603, f"Internal error: {e}")
+        return {"jsonrpc": "2.0", "id": request_id, "result": result.model_dump(mode="json", by_alias=True, exclude_none=True)}
+
+def _header_deadline(request: Request):
+    value = request.headers.get("x-deadline-ms")
+    try:
+        return max(0.0, float(value) / 1000) if value is not None else None
+    except ValueError:
+        return None
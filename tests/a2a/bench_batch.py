@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import httpx
+import router_server
+from bench_routing import build_stub_app, serve_in_thread
+from router_server import close_clients
+
+# Массовая выгрузка вопросов через роутер: по HTTP-запросу на вопрос против одного пакетного JSON-RPC запроса
+
+def rpc_item(i, text):
+    return {
+        "jsonrpc": "2.0",
+        "id": i,
+        "method": "message/send",
+        "params": {"message": {"role": "user", "parts": [{"kind": "text", "text": text}], "messageId": uuid.uuid4().hex}},
+    }
+
+def answer_text(response):
+    return response["result"]["parts"][0]["text"]
+
+async def run_single(client, url, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i, text):
+        async with semaphore:
+            response = await client.post(url, json=rpc_item(i, text))
+            return response.json()
+    return await asyncio.gather(*(one(i, text) for i, text in enumerate(questions)))
+
+async def run_batch(client, url, questions, size):
+    results = []
+    for start in range(0, len(questions), size):
+        items = [rpc_item(start + i, text) for i, text in enumerate(questions[start:start + size])]
+        response = await client.post(url, json=items)
+        results.extend(response.json())
+    return results
+
+async def run_stream(client, url, questions, size):
+    results = []
+    for start in range(0, len(questions), size):
+        items = [rpc_item(start + i, text) for i, text in enumerate(questions[start:start + size])]
+        async with client.stream("POST", url, json=items, headers={"Accept": "application/x-ndjson"}) as response:
+            async for line in response.aiter_lines():
+                if line:
+                    results.append(json.loads(line))
+    return sorted(results, key=lambda response: response["id"])
+
+async def main(args):
+    qa_answer = lambda text: f"Ответ: {text}\n(Источник: pdf)"
+    map_answer = lambda text: f"Top Places near {text} (radius: 1000m):\n1. Place"
+    servers = [
+        serve_in_thread(build_stub_app(qa_answer, lambda text: args.delay), args.port),
+        serve_in_thread(build_stub_app(map_answer, lambda text: args.delay), args.port + 1),
+    ]
+    router_server.BACKENDS["qa"] = [f"http://127.0.0.1:{args.port}"]
+    router_server.BACKENDS["map"] = [f"http://127.0.0.1:{args.port + 1}"]
+    servers.append(serve_in_thread(router_server.app, args.port + 2))
+    url = f"http://127.0.0.1:{args.port + 2}/"
+    questions = [f"Что такое onaitabu? #{i}" if i % 2 else f"кафе рядом с Dostyk Plaza #{i}" for i in range(args.questions)]
+
+    modes = [
+        (f"single x{args.concurrency}", lambda client: run_single(client, url, questions, args.concurrency)),
+        (f"batch {args.batch_size}", lambda client: run_batch(client, url, questions, args.batch_size)),
+        (f"ndjson {args.batch_size}", lambda client: run_stream(client, url, questions, args.batch_size)),
+    ]
+    if args.concurrency != 1:
+        modes.insert(0, ("single x1", lambda client: run_single(client, url, questions, 1)))
+    print(f"questions={args.questions} backend delay {args.delay * 1000:.0f}ms "
+          f"BATCH_CONCURRENCY={router_server.app._slots._value}")
+    print(f"{'mode':14} {'seconds':>8} {'rps':>7} {'http':>6} {'ok':>6} {'ordered':>8}")
+    try:
+        async with httpx.AsyncClient(timeout=600) as client:
+            for name, run in modes:
+                start = time.perf_counter()
+                results = await run(client)
+                wall = time.perf_counter() - start
+                ok = sum("result" in response for response in results)
+                ordered = [response["id"] for response in results] == list(range(len(questions)))
+                correct = all(text in answer_text(response) for text, response in zip(questions, results) if "result" in response)
+                http = args.questions if name.startswith("single") else -(-args.questions // args.batch_size)
+                print(f"{name:14} {wall:8.2f} {args.questions / wall:7.0f} {http:6d} {ok:6d} {str(ordered and correct):>8}")
+    finally:
+        await close_clients()
+        for server in servers:
+            server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk questions through the router: one HTTP request each vs JSON-RPC batches")
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--delay", type=float, default=0.02, help="backend delay, seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel single requests")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8300)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from detailscache import PlaceDetailsCache
+from map import _project_details
+
+# Обогащение лучших мест через Place Details: последовательно, параллельно и параллельно с кэшем по place_id
+
+def fake_details(place_id, rng):
+    # Полный ответ без маски полей: фото, отзывы, адресные компоненты и т.д.
+    return {
+        "place_id": place_id,
+        "name": f"Place {place_id}",
+        "formatted_address": "Abay Avenue 10, Almaty 050000, Kazakhstan",
+        "formatted_phone_number": "8 (727) 000-00-00",
+        "website": f"https://example.com/{place_id}",
+        "opening_hours": {"open_now": True, "weekday_text": [f"{day}: 9:00 AM – 10:00 PM" for day in
+                                                             ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")]},
+        "user_ratings_total": rng.randint(10, 2000),
+        "reviews": [{"author_name": f"user {i}", "rating": rng.randint(1, 5), "text": "Отличное место, вкусный кофе. " * 8}
+                    for i in range(5)],
+        "photos": [{"photo_reference": "x" * 200, "height": 1080, "width": 1920} for _ in range(10)],
+        "address_components": [{"long_name": "Almaty", "short_name": "Almaty", "types": ["locality"]}] * 6,
+    }
+
+class FakeDetailsApi:
+    def __init__(self, latency, seed=0):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.raw_bytes = 0
+        self.projected_bytes = 0
+
+    async def fetch(self, place_id):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        raw = fake_details(place_id, self.rng)
+        details = _project_details(raw)
+        self.raw_bytes += len(json.dumps(raw, ensure_ascii=False).encode())
+        self.projected_bytes += len(json.dumps(details, ensure_ascii=False).encode())
+        return details
+
+def make_answers(n, top, places, seed=0):
+    # Популярные места попадают в топ чаще (распределение Ципфа)
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(places)]
+    return [[f"place-{i}" for i in rng.choices(range(places), weights, k=top)] for _ in range(n)]
+
+async def sequential(place_ids, api):
+    return [await api.fetch(place_id) for place_id in place_ids]
+
+async def concurrent(place_ids, api):
+    return await asyncio.gather(*(api.fetch(place_id) for place_id in place_ids))
+
+async def run(answers, enrich):
+    latencies = []
+    for place_ids in answers:
+        start = time.perf_counter()
+        await enrich(place_ids)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies
+
+async def main(args):
+    answers = make_answers(args.answers, args.top, args.places)
+    cache = PlaceDetailsCache()
+    modes = [
+        ("sequential", sequential),
+        ("concurrent", concurrent),
+        ("cached", lambda place_ids, api: cache.get_many(place_ids, api.fetch, timeout=args.timeout)),
+    ]
+    print(f"answers={args.answers} top={args.top} details latency {args.latency * 1000:.0f}ms")
+    print(f"{'mode':11} {'calls':>6} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, enrich in modes:
+        api = FakeDetailsApi(args.latency)
+        latencies = await run(answers, lambda place_ids: enrich(place_ids, api))
+        print(f"{name:11} {api.calls:6d} {sum(latencies) / len(latencies) * 1000:8.1f} "
+              f"{latencies[len(latencies) // 2] * 1000:8.1f} {latencies[int(len(latencies) * 0.95)] * 1000:8.1f}")
+    print(f"cache entry: {api.projected_bytes / max(api.calls, 1):.0f} bytes projected "
+          f"vs {api.raw_bytes / max(api.calls, 1):.0f} bytes of the full details payload")
+    print("details cache:", cache.snapshot())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency added by Place Details enrichment: sequential, concurrent and cached")
+    parser.add_argument("--answers", type=int, default=200)
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("--places", type=int, default=1000, help="distinct places in the fake city")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated Place Details latency, seconds")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
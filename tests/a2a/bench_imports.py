@@ -0,0 +1,85 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+import httpx
+
+# Холодный старт серверов: время импорта (python -X importtime) и время до первого 200 на /ready
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+ENTRY_POINTS = ["router_server", "map_server", "answer_question_server"]
+
+def bench_env(tmp) -> dict:
+    # Без сети: Q&A на локальном индексе, ключи-заглушки, кэши во временном каталоге
+    env = {**os.environ, "PYTHONPATH": HERE, "QA_RETRIEVAL": "local", "OPENAI_API_KEY": "bench",
+           "GOOGLE_MAPS_API_KEY": "bench", "PDF_INDEX_PATH": os.path.join(tmp, "project_info.idx"),
+           "GEOCODE_CACHE_PATH": os.path.join(tmp, "geocode.sqlite3"), "SERVER_WORKERS": "1"}
+    env.pop("PDF_INDEX_EMBEDDING_MODEL", None)
+    return env
+
+def import_report(module, env) -> tuple:
+    """
+    Seconds to import module and self time (seconds) per top-level package, from python -X importtime.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    total, packages = 0.0, Counter()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1e6
+        if name.strip() == module:
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+def time_to_ready(module, port, env, timeout) -> tuple:
+    """
+    Seconds from process start until the port answers and until GET /ready returns 200 (None on timeout).
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = ready = None
+    try:
+        while time.perf_counter() - start < timeout and proc.poll() is None:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1)
+            except httpx.HTTPError:
+                time.sleep(0.02)
+                continue
+            listening = listening or time.perf_counter() - start
+            if response.status_code == 200:
+                ready = time.perf_counter() - start
+                break
+            time.sleep(0.02)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return listening, ready
+
+def main(args):
+    modules = args.modules or ENTRY_POINTS
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bench_env(tmp)
+        print(f"{'entry point':24} {'import s':>9} {'listening s':>12} {'ready s':>8}  heaviest packages (self time)")
+        for n, module in enumerate(modules):
+            total, packages = import_report(module, env)
+            listening, ready = time_to_ready(module, args.port + n, env, args.timeout) if args.ready else (None, None)
+            heaviest = ", ".join(f"{name} {seconds:.2f}" for name, seconds in packages.most_common(args.top))
+            fmt = lambda value: f"{value:.2f}" if value is not None else "-"
+            print(f"{module:24} {total:9.2f} {fmt(listening):>12} {fmt(ready):>8}  {heaviest}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time and time to /ready for each A2A server entry point")
+    parser.add_argument("modules", nargs="*", help=f"entry points (default: {' '.join(ENTRY_POINTS)})")
+    parser.add_argument("--top", type=int, default=4, help="heaviest packages to list")
+    parser.add_argument("--ready", action="store_true", help="also start each server and poll /ready")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--port", type=int, default=8380)
+    main(parser.parse_args())
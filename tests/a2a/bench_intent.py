@@ -0,0 +1,75 @@
+import argparse
+import random
+import string
+import sys
+import time
+from intent import IntentClassifier, load_keyword_files
+
+QUERIES = [
+    "best cafes near Satpaev University",
+    "кафе рядом с Satpaev University",
+    "Сәтбаев университетінің маңындағы мейрамханалар",
+    "Что такое onaitabu?",
+    "как зарегистрироваться в приложении",
+    "how do I reset my password in the app",
+    "где находится ближайшая аптека",
+    "Сколько стоит подписка и какие есть тарифы?",
+]
+
+# Куда обязан уйти запрос; вторая половина — слова, похожие на map-термины только началом ("паркур" — не "парк")
+ROUTES = [(query, "map") for query in (
+    "best cafes near Satpaev University", "кафе рядом с Satpaev University", "Сәтбаев университетінің маңындағы мейрамханалар",
+    "где находится ближайшая аптека", "ищу кофейни в центре", "покажи гостиницы на карте", "банкоматтар қайда",
+    "coffee shops nearby", "nearest hotels", "как добраться до парка", "ближайшие банкоматы", "аптеку на Абая",
+    "дәріханалар", "барларда", "restaurants around Dostyk",
+)] + [(query, "qa") for query in (
+    "картофель фри рецепт", "паркур", "школьная форма", "театральный кружок", "барабан", "банкет",
+    "Что такое onaitabu?", "как зарегистрироваться в приложении", "how do I reset my password in the app",
+    "Сколько стоит подписка и какие есть тарифы?",
+)]
+
+# Старая реализация: линейный поиск подстрок по списку
+def linear_classify(query, keywords):
+    if any(k in query.lower() for k in keywords):
+        return "map"
+    return "qa"
+
+def synthetic_terms(n, seed=0):
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + "абвгдежзиклмнопрстуфхцчшыэюяқғңүұәі"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(5, 12))) for _ in range(n)]
+
+def per_query(fn, queries, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (rounds * len(queries))
+
+def main(args):
+    keywords = load_keyword_files()
+    classifier = IntentClassifier(keywords)
+    failures = [(query, expected, classifier.classify(query)) for query, expected in ROUTES if classifier.classify(query) != expected]
+    print(f"{len(ROUTES)} routing cases: {len(failures)} mismatches")
+    for query, expected, got in failures:
+        print(f"  {query!r}: {got} != {expected}")
+    for extra in args.sizes:
+        terms = keywords["map"] + synthetic_terms(extra)
+        start = time.perf_counter()
+        classifier = IntentClassifier({"map": terms})
+        build = time.perf_counter() - start
+        linear = per_query(lambda q: linear_classify(q, terms), QUERIES, args.rounds)
+        compiled = per_query(classifier.classify, QUERIES, args.rounds)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            classifier.classify_many(QUERIES)
+        batch = (time.perf_counter() - start) / (args.rounds * len(QUERIES))
+        print(f"{len(terms):6d} terms: build {build * 1000:7.1f}ms | linear {linear * 1e6:8.2f}us/query | "
+              f"compiled {compiled * 1e6:6.2f}us/query | batch {batch * 1e6:6.2f}us/query")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Router intent classification cost vs keyword set size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=2000)
+    sys.exit(main(parser.parse_args()))
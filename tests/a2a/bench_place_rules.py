@@ -0,0 +1,75 @@
+import argparse
+import sys
+import time
+from place_rules import PlaceRuleExtractor
+
+# Что быстрый разбор map-запросов обязан принять (с ожидаемым результатом) и что обязан отдать LLM
+ACCEPTED = [
+    ("best cafes near Satpaev University", ("cafes", "Satpaev University, Almaty", 1000)),
+    ("pharmacy close to Mega Park within 500m", ("pharmacy", "Mega Park, Almaty", 500)),
+    ("cafes in Almaty", ("cafes", "Almaty", 1000)),
+    ("hotels at Dostyk Plaza", ("hotels", "Dostyk Plaza, Almaty", 1000)),
+    ("кафе рядом с Satpaev University", ("кафе", "Satpaev University, Almaty", 1000)),
+    ("найди аптеку около ТРЦ Мега в радиусе 2 км", ("аптеку", "ТРЦ Мега, Almaty", 2000)),
+    ("рестораны возле Абая 10", ("рестораны", "Абая 10, Almaty", 1000)),
+    ("кафе на Абая", ("кафе", "Абая, Almaty", 1000)),
+    ("банк у Есентай Молла", ("банк", "Есентай Молла, Almaty", 1000)),
+    ("Сәтбаев университетінің маңындағы мейрамханалар", ("мейрамханалар", "Сәтбаев университеті, Almaty", 1000)),
+    ("Абай даңғылы маңындағы дәріханалар 500 метр ішінде", ("дәріханалар", "Абай даңғылы, Almaty", 500)),
+]
+
+REJECTED = [
+    "кафе на карте",
+    "покажи кафе на карте рядом",
+    "find a bank in Almaty with good reviews",
+    "cafe in 5 minutes from Mega",
+    "cafes near Mega open now",
+    "кафе рядом с Мегой с хорошими отзывами",
+    "аптека в 10 минутах от дома",
+    "аптека рядом с домом которая работает круглосуточно",
+    "кафе в центре",
+    "cafe at night",
+    "bar by the river",
+    "cafes near Dostyk Plaza on the map",
+    "Chef and Sweets",
+    "how far is the nearest pharmacy",
+    "где находится офис onaitabu?",
+    "pharmacy near me",
+    "cafe near here",
+    "park near my house",
+    "cafe near my location",
+    "кафе рядом со мной",
+    "кафе около меня",
+    "парк возле дома",
+]
+
+def check(extractor) -> list:
+    failures = []
+    for query, expected in ACCEPTED:
+        got = extractor.extract(query)
+        if got != expected:
+            failures.append(f"accept  {query!r}: {got!r} != {expected!r}")
+    for query in REJECTED:
+        got = extractor.extract(query)
+        if got is not None:
+            failures.append(f"reject  {query!r}: {got!r}")
+    return failures
+
+def main(args):
+    extractor = PlaceRuleExtractor.from_directory()
+    failures = check(extractor)
+    print(f"{len(ACCEPTED)} accepted, {len(REJECTED)} rejected queries: {len(failures)} mismatches")
+    for failure in failures:
+        print(" ", failure)
+    queries = [query for query, _ in ACCEPTED] + REJECTED
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for query in queries:
+            extractor.extract(query)
+    print(f"{(time.perf_counter() - start) / (args.rounds * len(queries)) * 1e6:.1f}us/query, stats: {extractor.snapshot()}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rule-based map query parsing: table of accepted/rejected queries and cost per query")
+    parser.add_argument("--rounds", type=int, default=200)
+    sys.exit(main(parser.parse_args()))
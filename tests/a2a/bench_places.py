@@ -0,0 +1,102 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from places import parse_places
+from placescache import PLACES_PAGE_SIZE
+
+# Память и скорость: полные результаты Nearby Search (dict) против компактных записей Place
+
+def fake_result(rng, i) -> dict:
+    # Результат Nearby Search со всеми полями, которые API отдаёт без маски
+    lat, lng = 43.2380 + rng.gauss(0, 0.03), 76.9450 + rng.gauss(0, 0.04)
+    token = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-") for _ in range(27))
+    return {
+        "business_status": "OPERATIONAL",
+        "geometry": {
+            "location": {"lat": lat, "lng": lng},
+            "viewport": {"northeast": {"lat": lat + 0.0013, "lng": lng + 0.0013}, "southwest": {"lat": lat - 0.0013, "lng": lng - 0.0013}},
+        },
+        "icon": "https://maps.gstatic.com/mapfiles/place_api/icons/v1/png_71/cafe-71.png",
+        "icon_background_color": "#FF9E67",
+        "icon_mask_base_uri": "https://maps.gstatic.com/mapfiles/place_api/icons/v2/cafe_pinlet",
+        "name": f"Кафе «Place {i}»",
+        "opening_hours": {"open_now": rng.random() < 0.7},
+        "photos": [{
+            "height": 3024,
+            "html_attributions": [f'<a href="https://maps.google.com/maps/contrib/{rng.randrange(10 ** 20)}">Автор {i}</a>'],
+            "photo_reference": "AUjq9j" + token * 14,
+            "width": 4032,
+        }],
+        "place_id": f"ChIJ{token}",
+        "plus_code": {"compound_code": "6W9M+Q2 Almaty, Kazakhstan", "global_code": "8R8W6W9M+Q2"},
+        "price_level": rng.randint(1, 4),
+        "rating": round(rng.uniform(3, 5), 1),
+        "reference": f"ChIJ{token}",
+        "scope": "GOOGLE",
+        "types": ["cafe", "restaurant", "food", "point_of_interest", "establishment"],
+        "user_ratings_total": rng.randint(1, 3000),
+        "vicinity": f"{rng.randint(1, 300)} Abay Avenue, Almaty",
+    }
+
+def fake_pages(n, seed=0) -> list:
+    rng = random.Random(seed)
+    return [json.dumps({"html_attributions": [], "results": [fake_result(rng, p * PLACES_PAGE_SIZE + i) for i in range(PLACES_PAGE_SIZE)],
+                        "status": "OK"}, ensure_ascii=False) for p in range(n)]
+
+def retained(pages, keep) -> int:
+    # Сколько байт остаётся в памяти после разбора страниц и сохранения того, что вернул keep(results)
+    gc.collect()
+    tracemalloc.start()
+    kept = [keep(json.loads(page)["results"]) for page in pages]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+def format_dicts(results, top):
+    return [f"{i}. {p.get('name')} (Rating: {p.get('rating', 'N/A')}) - {p.get('vicinity')}" for i, p in enumerate(results[:top], 1)]
+
+def format_records(places, top):
+    return [f"{i}. {p.name} (Rating: {p.rating if p.rating is not None else 'N/A'}) - {p.vicinity}" for i, p in enumerate(places[:top], 1)]
+
+def throughput(pages, handle, repeat) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            handle(json.loads(page)["results"])
+    return len(pages) * repeat / (time.perf_counter() - start)
+
+def main(args):
+    pages = fake_pages(args.pages)
+    places = args.pages * PLACES_PAGE_SIZE
+    print(f"{args.pages} Nearby Search pages x {PLACES_PAGE_SIZE} results, {sum(map(len, pages)) / args.pages / 1024:.1f} KB JSON per page")
+
+    # Что держит кэш: весь ответ, как раньше, или записи Place
+    raw = retained(pages, lambda results: results)
+    records = retained(pages, lambda results: parse_places(results))
+    top = retained(pages, lambda results: parse_places(results, args.top))
+    print(f"\n{'cached':16} {'bytes/place':>12} {'places per GB':>14}")
+    for name, size, count in (("raw dicts", raw, places), ("Place records", records, places), (f"Place top {args.top}", top, args.pages * args.top)):
+        print(f"{name:16} {size / count:12.0f} {count / size * 2 ** 30:14,.0f}")
+
+    # Разбор ответа и форматирование лучших мест, как в map_stream
+    modes = [
+        ("raw dicts", lambda results: format_dicts(results, args.top)),
+        ("Place records", lambda results: format_records(parse_places(results), args.top)),
+        (f"Place top {args.top}", lambda results: format_records(parse_places(results, args.top), args.top)),
+    ]
+    print(f"\n{'answer from page':16} {'pages/s':>12}")
+    for name, handle in modes:
+        throughput(pages, handle, 1)
+        print(f"{name:16} {throughput(pages, handle, args.repeat):12,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per cached place and parse+format throughput: raw Places JSON vs Place records")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+from places import Place
+from placescache import PlacesCache, PLACES_PAGE_SIZE
+
+# Центр Алматы и несколько популярных точек, вокруг которых кучкуются запросы
+ALMATY = (43.2380, 76.9450)
+HOTSPOTS = [(43.2364, 76.9300), (43.2567, 76.9286), (43.2330, 76.9560), (43.2220, 76.8510), (43.2610, 76.9460)]
+PLACE_TYPES = ["cafes", "restaurants", "pharmacy", "hotels", "кафе"]
+EARTH_RADIUS_M = 6371000.0
+
+def haversine(lat1, lng1, lat2, lng2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+class FakePlaces:
+    """
+    Nearby Search stand-in: a fixed random set of places per keyword, each with a prominence score;
+    returns the 20 most prominent places inside the circle, most prominent first (rankby=prominence).
+    """
+
+    def __init__(self, latency, places_per_type, seed=0):
+        rng = random.Random(seed)
+        self.latency = latency
+        self.calls = 0
+        self.places = {}
+        for keyword in PLACE_TYPES:
+            places = [
+                (rng.paretovariate(1.5), Place(f"{keyword}-{i}", f"{keyword} #{i}", None, None,
+                                              ALMATY[0] + rng.gauss(0, 0.03), ALMATY[1] + rng.gauss(0, 0.04)))
+                for i in range(places_per_type)
+            ]
+            places.sort(key=lambda item: -item[0])
+            self.places[keyword] = [place for _, place in places]
+
+    async def search(self, lat, lng, keyword, radius):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        found = [p for p in self.places[keyword] if haversine(lat, lng, p.lat, p.lng) <= radius]
+        return found[:PLACES_PAGE_SIZE]
+
+def make_queries(n, jitter_m, locations, seed=0):
+    # Точка запроса — результат геокодинга локации из текста. С locations > 0 запросы называют одну из
+    # стольких локаций (популярные чаще, по Ципфу), и одна локация всегда даёт одну точку; 0 — все точки разные
+    rng = random.Random(seed)
+
+    def point():
+        lat, lng = rng.choice(HOTSPOTS)
+        dlat = math.degrees(rng.gauss(0, jitter_m) / EARTH_RADIUS_M)
+        dlng = dlat / math.cos(math.radians(lat)) * rng.choice((-1, 1))
+        return lat + dlat, lng + dlng
+
+    named = [point() for _ in range(locations)]
+    weights = [1 / (i + 1) for i in range(locations)]
+    queries = []
+    for _ in range(n):
+        lat, lng = rng.choices(named, weights)[0] if named else point()
+        queries.append((lat, lng, rng.choice(PLACE_TYPES), rng.choice((300, 500, 1000))))
+    return queries
+
+async def run(queries, search, limit):
+    latencies, answers = [], []
+    for lat, lng, keyword, radius in queries:
+        start = time.perf_counter()
+        places = await search(lat, lng, keyword, radius)
+        latencies.append(time.perf_counter() - start)
+        answers.append([place.place_id for place in places[:limit]])
+    latencies.sort()
+    return latencies, answers
+
+async def main(args):
+    print(f"{'places/type':>11} {'locations':>9} {'mode':8} {'places calls':>12} {'mean ms':>9} {'p50 ms':>9} "
+          f"{'p95 ms':>9} {'same top-k':>10}")
+    mismatches = 0
+    for places in args.places:
+        for locations in args.locations:
+            queries = make_queries(args.queries, args.jitter, locations)
+            direct = FakePlaces(args.latency, places)
+            direct_lat, expected = await run(queries, direct.search, args.limit)
+
+            cached = FakePlaces(args.latency, places)
+            cache = PlacesCache()
+            cached_lat, answers = await run(
+                queries, lambda lat, lng, keyword, radius: cache.search(lat, lng, keyword, radius, cached.search, limit=args.limit), args.limit)
+
+            # Ответ из кэша обязан совпадать с прямым поиском целиком, включая порядок
+            same = sum(got == want for got, want in zip(answers, expected))
+            mismatches += len(queries) - same
+            for name, calls, lat, matched in (("direct", direct.calls, direct_lat, len(queries)), ("cache", cached.calls, cached_lat, same)):
+                print(f"{places:11d} {locations:9d} {name:8} {calls:12d} {sum(lat) / len(lat) * 1000:9.2f} "
+                      f"{lat[len(lat) // 2] * 1000:9.2f} {lat[int(len(lat) * 0.95)] * 1000:9.2f} {matched / len(queries):10.3f}")
+            print("  places cache:", cache.snapshot())
+    print(f"{mismatches} cached answers differ from the direct search")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Places Nearby Search calls, latency and answers with and without the answer cache")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--jitter", type=float, default=300, help="spread of query points around hotspots, meters")
+    parser.add_argument("--locations", type=int, nargs="+", default=[0, 200],
+                        help="distinct geocoded locations the queries name (0: every query point is different)")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Places latency, seconds")
+    parser.add_argument("--places", type=int, nargs="+", default=[100, 3000], help="places per type in the fake city (sparse, dense)")
+    parser.add_argument("--limit", type=int, default=5, help="places shown per answer (MAP_TOP_PLACES)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,44 @@
+import argparse
+import os
+import tempfile
+import time
+from pdf_index import PdfIndex, build_pdf_index
+
+QUERIES = [
+    "Что такое onaitabu?",
+    "Как ИИ ведёт переговоры с продавцами?",
+    "Какие конкуренты у проекта?",
+    "монетизация и тарифы",
+    "how does the assistant book a hotel",
+]
+
+def main(args):
+    index_path = os.path.join(tempfile.mkdtemp(prefix="onaitabu-index-"), "project_info.idx")
+
+    start = time.perf_counter()
+    build_pdf_index(args.pdf, index_path)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = PdfIndex(index_path)
+    opened = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            index.search(query, args.k)
+    per_query = (time.perf_counter() - start) / (args.rounds * len(QUERIES))
+
+    print(f"chunks: {len(index)}, index size: {os.path.getsize(index_path) / 1024:.1f} KiB")
+    print(f"build: {build * 1000:.0f} ms, open: {opened * 1000:.2f} ms, search: {per_query * 1e6:.1f} us/query (top-{args.k})")
+    for query in QUERIES:
+        hits = index.search(query, 1)
+        print(f"  {query!r} -> " + (f"p.{hits[0][1]}: {hits[0][2][:60]}..." if hits else "no match"))
+    index.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local PDF retrieval index: build, open and search cost")
+    parser.add_argument("--pdf", default="data/project_info.pdf")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import threading
+import time
+import requests
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import router_server
+from router_server import build_payload, parse_backend_response, call_backend, close_clients
+
+# Локальный stub backend: отвечает как A2A-агент с искусственной задержкой
+def build_stub_app(delay: float) -> Starlette:
+    async def rpc(request):
+        body = await request.json()
+        await asyncio.sleep(delay)
+        text = body["params"]["message"]["parts"][0]["text"]
+        return JSONResponse({
+            "jsonrpc": "2.0",
+            "id": body.get("id"),
+            "result": {
+                "kind": "message",
+                "messageId": "1",
+                "role": "agent",
+                "parts": [{"kind": "text", "text": f"echo: {text}"}]
+            }
+        })
+    return Starlette(routes=[Route("/", rpc, methods=["POST"])])
+
+def start_stub(port: int, delay: float) -> uvicorn.Server:
+    config = uvicorn.Config(build_stub_app(delay), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+# "До": синхронный requests.post прямо внутри async-обработчика
+async def call_backend_blocking(url: str, query: str) -> str:
+    resp = requests.post(url + "/", json=build_payload(query))
+    resp.raise_for_status()
+    return parse_backend_response(resp.json())
+
+async def run(call, url: str, requests_total: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await call(url, f"query {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests_total)))
+    return time.perf_counter() - start
+
+async def main(args):
+    url = f"http://127.0.0.1:{args.port}"
+    before = await run(call_backend_blocking, url, args.requests, args.concurrency)
+    after = await run(call_backend, url, args.requests, args.concurrency)
+    await close_clients()
+    print(f"requests={args.requests} concurrency={args.concurrency} backend delay={args.delay * 1000:.0f}ms pool={router_server.BACKEND_POOL_SIZE}")
+    print(f"before (requests.post): {before:.2f}s, {args.requests / before:.1f} req/s")
+    print(f"after  (httpx pool):    {after:.2f}s, {args.requests / after:.1f} req/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of router -> backend calls against a local stub backend")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.05, help="stub backend latency, seconds")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    server = start_stub(args.port, args.delay)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import random
+import statistics
+import threading
+import time
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import router_server
+from router_server import close_clients
+
+# Хеджирование и fan-out роутера против локальных stub backend-ов с управляемыми задержками
+
+def build_stub_app(answer, delay):
+    async def rpc(request):
+        body = await request.json()
+        text = body["params"]["message"]["parts"][0]["text"]
+        await asyncio.sleep(delay(text))
+        return JSONResponse({
+            "jsonrpc": "2.0",
+            "id": body.get("id"),
+            "result": {"kind": "message", "messageId": "1", "role": "agent",
+                       "parts": [{"kind": "text", "text": answer(text)}]},
+        })
+    return Starlette(routes=[Route("/", rpc, methods=["POST"])])
+
+def serve_in_thread(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+async def run_hedge(args, hedge):
+    router_server.ROUTER_HEDGE = hedge
+    router_server.latency["qa"] = router_server.LatencyTracker()
+    router_server.HEDGES._values.clear()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await timed(router_server.ask_backend("qa", f"Что такое onaitabu? #{i}"))
+    wall, results = await timed(asyncio.gather(*(one(i) for i in range(args.requests))))
+    latencies = [elapsed for elapsed, _ in results]
+    hedges = router_server.HEDGES._values
+    return latencies, args.requests / wall, hedges.get(("qa", "issued"), 0), hedges.get(("qa", "won"), 0)
+
+async def run_fanout(queries, fanout):
+    router_server.ROUTER_FANOUT = fanout
+    correct, latencies = 0, []
+    for query, expected in queries:
+        elapsed, answer = await timed(router_server.route(query))
+        good = ("Top " in answer) if expected == "map" else answer.endswith("(Источник: pdf)")
+        if not good:
+            # Неверный backend: пользователь переспрашивает, запрос повторяется в нужный backend
+            retry, _ = await timed(router_server.ask_backend(expected, query))
+            elapsed += retry
+        correct += good
+        latencies.append(elapsed)
+    return correct, latencies
+
+async def main(args):
+    rng = random.Random(1)
+    # Q&A с тяжёлым хвостом: args.slow_share запросов отвечают за args.slow секунд
+    qa_delay = lambda text: args.slow if rng.random() < args.slow_share else args.fast
+    qa_answer = lambda text: "Ответ по документации.\n(Источник: pdf)" if "onaitabu" in text else "Общий ответ.\n(Источник: llm)"
+    map_answer = lambda text: "Top Places near X (radius: 1000m):\n1. Place" if "Plaza" in text or "Mega" in text \
+        else "Could not extract place type, location, or radius from the prompt."
+    servers = [
+        serve_in_thread(build_stub_app(qa_answer, qa_delay), args.port),
+        serve_in_thread(build_stub_app(qa_answer, qa_delay), args.port + 1),
+        serve_in_thread(build_stub_app(map_answer, lambda text: args.map_delay), args.port + 2),
+    ]
+    router_server.BACKENDS["qa"] = [f"http://127.0.0.1:{args.port}", f"http://127.0.0.1:{args.port + 1}"]
+    router_server.BACKENDS["map"] = [f"http://127.0.0.1:{args.port + 2}"]
+    try:
+        print(f"hedging: requests={args.requests} concurrency={args.concurrency} "
+              f"qa delay {args.fast * 1000:.0f}ms, {args.slow_share:.0%} at {args.slow * 1000:.0f}ms")
+        print(f"{'mode':10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rps':>6} {'hedges':>7} {'won':>5}")
+        for hedge in (False, True):
+            latencies, rps, issued, won = await run_hedge(args, hedge)
+            print(f"{'hedge' if hedge else 'single':10} {percentile(latencies, 50) * 1000:8.1f} "
+                  f"{percentile(latencies, 95) * 1000:8.1f} {percentile(latencies, 99) * 1000:8.1f} "
+                  f"{max(latencies) * 1000:8.1f} {rps:6.0f} {issued:7d} {won:5d}")
+
+        # Неоднозначные запросы: без ключевых слов или с ключевыми словами обоих агентов
+        router_server.ROUTER_HEDGE = False
+        queries = [("Dostyk Plaza", "map"), ("Mega Park", "map"), ("Где находится офис onaitabu?", "qa"),
+                   ("Сколько стоит подписка?", "qa"), ("Расскажи про onaitabu рядом со мной", "qa")] * 4
+        print(f"\nfan-out: {len(queries)} ambiguous queries, map delay {args.map_delay * 1000:.0f}ms "
+              "(a wrong answer costs a retry to the right backend)")
+        print(f"{'mode':10} {'right':>7} {'mean ms':>8} {'max ms':>8}")
+        for fanout in (False, True):
+            correct, latencies = await run_fanout(queries, fanout)
+            print(f"{'fanout' if fanout else 'single':10} {correct:3d}/{len(queries):<3d} "
+                  f"{statistics.mean(latencies) * 1000:8.1f} {max(latencies) * 1000:8.1f}")
+    finally:
+        await close_clients()
+        for server in servers:
+            server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail latency with request hedging and misroute cost with fan-out routing")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--fast", type=float, default=0.02, help="usual Q&A delay, seconds")
+    parser.add_argument("--slow", type=float, default=1.0, help="tail Q&A delay, seconds")
+    parser.add_argument("--slow-share", type=float, default=0.03)
+    parser.add_argument("--map-delay", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8195)
+    asyncio.run(main(parser.parse_args()))
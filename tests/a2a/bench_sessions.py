@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import uuid
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from session_store import BoundedSessionService
+
+# Память и скорость хранилищ сессий ADK: каждый синтетический диалог = сессия + ход пользователя и ответ модели
+
+APP_NAME = "onaitabu_map"
+USER_ID = "user_map"
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+def make_turn(i: int) -> list:
+    query = f"кафе рядом с Satpaev University #{i}"
+    answer = json.dumps({"place_type": "кафе", "location": f"Satpaev University #{i}, Almaty", "radius": 500}, ensure_ascii=False)
+    invocation_id = f"e-{uuid.uuid4()}"
+    return [
+        Event(invocation_id=invocation_id, author="user", content=types.Content(role="user", parts=[types.Part(text=query)])),
+        Event(invocation_id=invocation_id, author="place_extractor_agent", content=types.Content(role="model", parts=[types.Part(text=answer)])),
+    ]
+
+async def fill(service, sessions: int, turns: int) -> float:
+    start = time.perf_counter()
+    for i in range(sessions):
+        session = await service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=f"ctx-{i}")
+        for turn in range(turns):
+            for event in make_turn(i * turns + turn):
+                await service.append_event(session, event)
+    return time.perf_counter() - start
+
+def run_one(kind: str, sessions: int, turns: int, max_sessions: int) -> dict:
+    service = InMemorySessionService() if kind == "memory" else BoundedSessionService(max_sessions=max_sessions)
+    before = rss_bytes()
+    elapsed = asyncio.run(fill(service, sessions, turns))
+    retained = len(service) if kind == "bounded" else sum(len(s) for users in service.sessions.values() for s in users.values())
+    return {"kind": kind, "sessions": sessions, "retained": retained, "rss_mb": (rss_bytes() - before) / 2**20,
+            "us_per_session": elapsed / sessions * 1e6}
+
+def main(args):
+    if args.child:
+        print(json.dumps(run_one(args.child, args.sessions, args.turns, args.max_sessions)))
+        return
+    runs = [("memory", args.baseline_sessions), ("bounded", args.sessions)]
+    print(f"{'store':8} {'sessions':>9} {'retained':>9} {'rss MB':>9} {'KB/session':>11} {'us/session':>11}")
+    for kind, sessions in runs:
+        # Каждый вариант в отдельном процессе, чтобы RSS не смешивался
+        out = subprocess.run([sys.executable, __file__, "--child", kind, "--sessions", str(sessions), "--turns", str(args.turns),
+                              "--max-sessions", str(args.max_sessions)], capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{kind:8} {result['sessions']:9d} {result['retained']:9d} {result['rss_mb']:9.1f} "
+              f"{result['rss_mb'] * 1024 / result['sessions']:11.2f} {result['us_per_session']:11.1f}")
+    print("InMemorySessionService keeps every session; its memory grows linearly with the session count above.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and speed of ADK session stores under many synthetic sessions")
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="sessions pushed through the bounded store")
+    parser.add_argument("--baseline-sessions", type=int, default=50_000, help="sessions for InMemorySessionService (grows without bound)")
+    parser.add_argument("--turns", type=int, default=1)
+    parser.add_argument("--max-sessions", type=int, default=10_000)
+    parser.add_argument("--child", choices=["memory", "bounded"], help=argparse.SUPPRESS)
+    main(parser.parse_args())
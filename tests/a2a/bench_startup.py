@@ -0,0 +1,98 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+from question_answer import AppAgentDeps, setup_vector_store
+
+# Локальная имитация OpenAI client: те же вызовы, задержки как у реального API
+class FakeOpenAI:
+    def __init__(self, latency: float = 0.2, upload_latency: float = 2.0):
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.stores = {}
+        self.files = SimpleNamespace(create=self._create_file, delete=self._delete_file)
+        self.vector_stores = SimpleNamespace(
+            create=self._create_store,
+            retrieve=self._retrieve_store,
+            delete=self._delete_store,
+            files=SimpleNamespace(create=self._attach_file, retrieve=self._retrieve_store_file),
+        )
+        self.uploads = 0
+
+    def _create_store(self, name):
+        time.sleep(self.latency)
+        store = SimpleNamespace(id=f"vs_{uuid.uuid4().hex}", status="completed", files={})
+        self.stores[store.id] = store
+        return store
+
+    def _retrieve_store(self, vector_store_id):
+        time.sleep(self.latency)
+        return self.stores[vector_store_id]
+
+    def _delete_store(self, vector_store_id):
+        self.stores.pop(vector_store_id, None)
+
+    def _create_file(self, file, purpose):
+        file.read()
+        time.sleep(self.upload_latency)
+        self.uploads += 1
+        return SimpleNamespace(id=f"file_{uuid.uuid4().hex}")
+
+    def _delete_file(self, file_id):
+        pass
+
+    def _attach_file(self, vector_store_id, file_id):
+        # Индексация файла на стороне OpenAI
+        time.sleep(self.upload_latency)
+        self.stores[vector_store_id].files[file_id] = SimpleNamespace(id=file_id, status="completed")
+
+    def _retrieve_store_file(self, file_id, vector_store_id):
+        time.sleep(self.latency)
+        return self.stores[vector_store_id].files[file_id]
+
+def timed_setup(client, pdf_path, manifest_path):
+    start = time.perf_counter()
+    deps = setup_vector_store(AppAgentDeps(pdf_path=pdf_path), client=client, manifest_path=manifest_path)
+    return time.perf_counter() - start, deps
+
+def worker_setup(job):
+    # Один воркер сервера: свой процесс и свой client, общий (или отдельный) манифест
+    pdf_path, manifest_path, latency, upload_latency = job
+    client = FakeOpenAI(latency, upload_latency)
+    elapsed, deps = timed_setup(client, pdf_path, manifest_path)
+    return elapsed, client.uploads, deps.vector_store_id
+
+def run_workers(args, tmp, shared):
+    jobs = [(args.pdf, os.path.join(tmp, "manifest.json" if shared else f"manifest-{i}.json"), args.latency, args.upload_latency)
+            for i in range(args.workers)]
+    with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+        results = pool.map(worker_setup, jobs)
+    return max(r[0] for r in results), sum(r[1] for r in results), len({r[2] for r in results})
+
+def main(args):
+    if args.workers:
+        print(f"{args.workers} workers starting at once with no vector store yet")
+        with tempfile.TemporaryDirectory() as tmp:
+            for shared, label in ((False, "each worker on its own"), (True, "shared manifest + lock")):
+                slowest, uploads, stores = run_workers(args, tmp, shared)
+                print(f"{label:24} slowest start {slowest:.2f}s, uploads={uploads}, vector stores={stores}")
+        return
+    client = FakeOpenAI(args.latency, args.upload_latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest_path = os.path.join(tmp, "manifest.json")
+        cold, first = timed_setup(client, args.pdf, manifest_path)
+        warm, second = timed_setup(client, args.pdf, manifest_path)
+    assert first.vector_store_id == second.vector_store_id
+    print(f"cold start (upload):   {cold:.2f}s")
+    print(f"warm start (manifest): {warm:.2f}s, same vector store reused, uploads={client.uploads}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Q&A server vector store setup time with and without the manifest")
+    parser.add_argument("--pdf", default="data/project_info.pdf")
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated API call latency, seconds")
+    parser.add_argument("--upload-latency", type=float, default=2.0, help="simulated upload/indexing latency, seconds")
+    parser.add_argument("--workers", type=int, default=0, help="start this many worker processes concurrently instead")
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+import uvicorn
+from a2a.types import AgentCard, AgentCapabilities, Message, Role, Part, TextPart
+from a2a.server.request_handlers.request_handler import RequestHandler
+from a2a.server.apps import A2AStarletteApplication
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import FunctionModel, DeltaToolCall
+from question_answer import AppAgentOutput, stream_answer
+from router_server import call_backend, stream_backend, close_clients
+
+ANSWER = (
+    "Onaitabu — это приложение, которое помогает находить кафе, рестораны и другие места рядом с вами, "
+    "показывает рейтинги и адреса и отвечает на вопросы о самом приложении."
+)
+
+# Фейковая модель: отдаёт JSON ответа по токену с задержкой, как настоящая LLM
+def build_fake_agent(token_delay: float, token_size: int) -> Agent:
+    args = json.dumps({"answer": ANSWER, "source": "pdf"}, ensure_ascii=False)
+    tokens = -(-len(args) // token_size)
+
+    async def function(messages, info):
+        # Без стриминга модель отдаёт ответ только после генерации всех токенов
+        await asyncio.sleep(token_delay * tokens)
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, args)])
+
+    async def stream_function(messages, info):
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args="")}
+        for i in range(0, len(args), token_size):
+            await asyncio.sleep(token_delay)
+            yield {0: DeltaToolCall(json_args=args[i:i + token_size])}
+    return Agent(FunctionModel(function, stream_function=stream_function), output_type=AppAgentOutput)
+
+class FakeQAHandler(RequestHandler):
+    def __init__(self, agent: Agent):
+        self.agent = agent
+
+    async def on_message_send(self, params, context=None):
+        result = await self.agent.run(params.message.parts[0].root.text)
+        return Message(messageId="1", role=Role.agent, parts=[Part(root=TextPart(text=result.output.answer))], kind="message")
+    async def on_message_send_stream(self, params, context=None):
+        message_id = uuid.uuid4().hex
+        async for delta, final in stream_answer(self.agent, params.message.parts[0].root.text):
+            if delta:
+                yield Message(messageId=message_id, role=Role.agent, parts=[Part(root=TextPart(text=delta))], kind="message")
+    async def on_get_task(self, params, context=None):
+        return None
+    async def on_cancel_task(self, params, context=None):
+        return None
+    async def on_set_task_push_notification_config(self, params, context=None):
+        return None
+    async def on_get_task_push_notification_config(self, params, context=None):
+        return None
+    async def on_resubscribe_to_task(self, params, context=None):
+        return
+
+def start_backend(agent: Agent, port: int) -> uvicorn.Server:
+    card = AgentCard(
+        name="FakeQA", description="fake", version="1.0", url=f"http://127.0.0.1:{port}",
+        capabilities=AgentCapabilities(streaming=True), defaultInputModes=["text/plain"],
+        defaultOutputModes=["text/plain"], skills=[],
+    )
+    app = A2AStarletteApplication(agent_card=card, http_handler=FakeQAHandler(agent)).build()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def first_and_total(chunks):
+    start = time.perf_counter()
+    first = None
+    async for _ in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+async def main(args):
+    agent = build_fake_agent(args.token_delay, args.token_size)
+
+    start = time.perf_counter()
+    await agent.run("Что такое onaitabu?")
+    buffered = time.perf_counter() - start
+    streamed_first, streamed_total = await first_and_total(stream_answer(agent, "Что такое onaitabu?"))
+    print("agent only:")
+    print(f"  buffered  TTFT {buffered * 1000:7.1f}ms  total {buffered * 1000:7.1f}ms")
+    print(f"  streaming TTFT {streamed_first * 1000:7.1f}ms  total {streamed_total * 1000:7.1f}ms")
+
+    url = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    await call_backend(url, "Что такое onaitabu?")
+    routed = time.perf_counter() - start
+    proxied_first, proxied_total = await first_and_total(stream_backend(url, "Что такое onaitabu?"))
+    await close_clients()
+    print("router -> backend (message/send vs message/stream):")
+    print(f"  buffered  TTFT {routed * 1000:7.1f}ms  total {routed * 1000:7.1f}ms")
+    print(f"  streaming TTFT {proxied_first * 1000:7.1f}ms  total {proxied_total * 1000:7.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to first token with and without streaming, using a fake streaming model")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="delay between model tokens, seconds")
+    parser.add_argument("--token-size", type=int, default=4, help="characters per token")
+    parser.add_argument("--port", type=int, default=8097)
+    args = parser.parse_args()
+    server = start_backend(build_fake_agent(args.token_delay, args.token_size), args.port)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,268 @@
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+import httpx
+from resilience import detach, within
+
+# Настройки краулера страниц мест (crawl4ai)
+CRAWLER_MAX_PAGES = int(os.getenv("CRAWLER_MAX_PAGES", "8"))
+CRAWLER_DOMAIN_INTERVAL = float(os.getenv("CRAWLER_DOMAIN_INTERVAL", "1.0"))
+CRAWLER_PAGE_TIMEOUT = float(os.getenv("CRAWLER_PAGE_TIMEOUT", "30"))
+CRAWLER_REVALIDATE_TIMEOUT = float(os.getenv("CRAWLER_REVALIDATE_TIMEOUT", "5"))
+CRAWLER_CACHE_PATH = os.getenv("CRAWLER_CACHE_PATH", "crawl_cache.sqlite3")
+# Пока запись свежая, страница отдаётся из кэша; после — условный GET (ETag/Last-Modified) и краулинг только при изменении
+CRAWLER_CACHE_TTL = float(os.getenv("CRAWLER_CACHE_TTL", str(24 * 3600)))
+CRAWLER_TOOL_MAX_CHARS = int(os.getenv("CRAWLER_TOOL_MAX_CHARS", "8000"))
+
+class CrawlError(Exception):
+    pass
+
+class CrawledPage:
+    __slots__ = ("url", "markdown", "status_code", "fetched_at", "source")
+
+    def __init__(self, url, markdown, status_code, fetched_at, source):
+        self.url = url
+        self.markdown = markdown
+        self.status_code = status_code
+        self.fetched_at = fetched_at
+        # "crawl", "cache", "revalidated" или "stale" (краулинг не удался, отдана старая копия)
+        self.source = source
+
+class DomainRateLimiter:
+    """
+    Spaces requests to the same host at least `interval` seconds apart; different hosts do not wait for each other.
+    """
+
+    def __init__(self, interval=CRAWLER_DOMAIN_INTERVAL):
+        self.interval = interval
+        self._next = {}  # host -> monotonic time of the next allowed request
+
+    async def wait(self, url):
+        host = urlsplit(url).hostname or ""
+        now = time.monotonic()
+        # Резервируем слот синхронно, до await, поэтому параллельные вызовы встают в очередь по порядку
+        at = max(now, self._next.get(host, 0.0))
+        self._next[host] = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+class MarkdownCache:
+    """
+    SQLite store of extracted markdown with the validators (ETag, Last-Modified) needed for conditional revalidation.
+    """
+
+    def __init__(self, path=CRAWLER_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS crawl ("
+            "url TEXT PRIMARY KEY, markdown TEXT NOT NULL, status_code INTEGER, etag TEXT, last_modified TEXT, "
+            "fetched_at REAL NOT NULL)"
+        )
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT markdown, status_code, etag, last_modified, fetched_at FROM crawl WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("markdown", "status_code", "etag", "last_modified", "fetched_at"), row))
+
+    def put(self, url, markdown, status_code, etag, last_modified):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO crawl (url, markdown, status_code, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, markdown, status_code, etag, last_modified, time.time()),
+            )
+
+    def touch(self, url):
+        with self._lock:
+            self._db.execute("UPDATE crawl SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def _header(headers, name):
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+class CrawlerService:
+    """
+    Long-lived crawl4ai crawler: one warm headless browser started on first use, up to max_pages pages
+    crawled concurrently, requests to the same host rate limited, and extracted markdown cached with
+    conditional revalidation so an unchanged page never starts a browser page again.
+    """
+
+    def __init__(self, max_pages=CRAWLER_MAX_PAGES, domain_interval=CRAWLER_DOMAIN_INTERVAL,
+                 cache_path=CRAWLER_CACHE_PATH, ttl=CRAWLER_CACHE_TTL):
+        self.ttl = ttl
+        self.limiter = DomainRateLimiter(domain_interval)
+        self.cache = MarkdownCache(cache_path) if cache_path else None
+        self._max_pages = max_pages
+        self._pages = None
+        self._crawler = None
+        self._run_config = None
+        self._start_lock = None
+        self._http = None
+        self._inflight = {}  # url -> Task
+        self.stats = {"crawled": 0, "fresh_hits": 0, "revalidated": 0, "changed": 0, "stale_served": 0,
+                      "failed": 0, "coalesced": 0}
+
+    async def start(self):
+        # Браузер поднимается один раз и переиспользуется всеми запросами
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+            self._pages = asyncio.Semaphore(self._max_pages)
+        async with self._start_lock:
+            if self._run_config is None:
+                from crawl4ai import CrawlerRunConfig, CacheMode
+                # Кэшируем сами (с ревалидацией), поэтому встроенный кэш crawl4ai выключен; конфиг собирается один раз
+                self._run_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS, page_timeout=int(CRAWLER_PAGE_TIMEOUT * 1000),
+                                                    verbose=False)
+            if self._crawler is None:
+                from crawl4ai import AsyncWebCrawler, BrowserConfig
+                crawler = AsyncWebCrawler(config=BrowserConfig(headless=True, verbose=False, text_mode=True, light_mode=True))
+                await crawler.start()
+                self._crawler = crawler
+            if self._http is None or self._http.is_closed:
+                self._http = httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(CRAWLER_REVALIDATE_TIMEOUT))
+        return self
+
+    async def close(self):
+        if self._crawler is not None:
+            await self._crawler.close()
+            self._crawler = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    async def crawl(self, url) -> CrawledPage:
+        while True:
+            task = self._inflight.get(url)
+            if task is None:
+                # Краулинг — отдельная задача без срока запроса, который его начал: отмена этого запроса
+                # не отменяет остальных ждущих ту же страницу, каждый ждёт её в пределах своего срока
+                task = detach(self._crawl(url))
+                task.add_done_callback(functools.partial(self._crawled, url))
+                self._inflight[url] = task
+            else:
+                self.stats["coalesced"] += 1
+            try:
+                return await within("crawl", asyncio.shield(task))
+            except asyncio.CancelledError:
+                # Отменили сам краулинг, а не этот запрос — запускаем его заново
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+    async def crawl_many(self, urls, return_exceptions=True) -> list:
+        """
+        Crawl urls concurrently (bounded by max_pages and the per-host rate limit); results keep the order of urls.
+        """
+        return await asyncio.gather(*(self.crawl(url) for url in urls), return_exceptions=return_exceptions)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+    def _crawled(self, url, task):
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        if not task.cancelled():
+            # Ошибку получают только ожидающие эту страницу запросы; без них asyncio не пишет её в лог
+            task.exception()
+
+    async def _crawl(self, url):
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            self.stats["fresh_hits"] += 1
+            return CrawledPage(url, entry["markdown"], entry["status_code"], entry["fetched_at"], "cache")
+        await self.start()
+        if entry is not None:
+            if await self._not_modified(url, entry):
+                self.cache.touch(url)
+                self.stats["revalidated"] += 1
+                return CrawledPage(url, entry["markdown"], entry["status_code"], time.time(), "revalidated")
+            self.stats["changed"] += 1
+
+        try:
+            result = await self._fetch(url)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if entry is not None:
+                self.stats["stale_served"] += 1
+                return CrawledPage(url, entry["markdown"], entry["status_code"], entry["fetched_at"], "stale")
+            raise CrawlError(f"Could not crawl {url}: {e}") from e
+
+        markdown = str(result.markdown or "")
+        headers = result.response_headers or {}
+        if self.cache is not None:
+            self.cache.put(url, markdown, result.status_code, _header(headers, "etag"), _header(headers, "last-modified"))
+        self.stats["crawled"] += 1
+        return CrawledPage(url, markdown, result.status_code, time.time(), "crawl")
+
+    async def _not_modified(self, url, entry) -> bool:
+        # Условный GET без браузера: 304 значит, что сохранённый markdown актуален
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+        await self.limiter.wait(url)
+        try:
+            resp = await self._http.get(url, headers=headers)
+        except httpx.HTTPError:
+            return False
+        return resp.status_code == 304
+
+    async def _fetch(self, url):
+        async with self._pages:
+            await self.limiter.wait(url)
+            result = await self._crawler.arun(url=url, config=self._run_config)
+        if not result.success:
+            raise CrawlError(result.error_message or f"HTTP {result.status_code}")
+        return result
+
+# Один краулер на процесс, создаётся лениво
+_crawler = None
+
+def get_crawler() -> CrawlerService:
+    global _crawler
+    if _crawler is None:
+        _crawler = CrawlerService()
+    return _crawler
+
+async def close_crawler():
+    global _crawler
+    if _crawler is not None:
+        await _crawler.close()
+        _crawler = None
+
+async def fetch_page(url: str) -> str:
+    """
+    Open a web page (for example a place's Yandex Maps, 2GIS or website page) and return its content as markdown.
+
+    Args:
+        url: Full URL of the page to read.
+    """
+    try:
+        page = await get_crawler().crawl(url)
+    except CrawlError as e:
+        return f"Error: {e}"
+    markdown = page.markdown
+    if len(markdown) > CRAWLER_TOOL_MAX_CHARS:
+        markdown = markdown[:CRAWLER_TOOL_MAX_CHARS] + "\n\n[truncated]"
+    return markdown
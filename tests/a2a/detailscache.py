@@ -0,0 +1,121 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from geocache import MISS
+from resilience import detach, within
+
+# Настройки кэша Place Details: часы работы, телефон и сайт меняются редко, исчезнувшее место помним меньше
+PLACE_DETAILS_CACHE_TTL = float(os.getenv("PLACE_DETAILS_CACHE_TTL", str(24 * 3600)))
+PLACE_DETAILS_CACHE_NEGATIVE_TTL = float(os.getenv("PLACE_DETAILS_CACHE_NEGATIVE_TTL", str(3600)))
+PLACE_DETAILS_CACHE_SIZE = int(os.getenv("PLACE_DETAILS_CACHE_SIZE", "50000"))
+
+class PlaceDetailsCache:
+    """
+    In-process LRU of Place Details keyed by place_id with a TTL; None marks a place the API no longer knows.
+    Concurrent requests for the same place share one fetch, which runs outside any one request's deadline.
+    """
+
+    def __init__(self, ttl=PLACE_DETAILS_CACHE_TTL, negative_ttl=PLACE_DETAILS_CACHE_NEGATIVE_TTL, max_size=PLACE_DETAILS_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # place_id -> (details, expires_at)
+        self._inflight = {}  # place_id -> Task
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0, "coalesced": 0, "failures": 0, "timeouts": 0, "evictions": 0}
+
+    async def get(self, place_id, fetch):
+        """
+        Details for place_id from the cache, or from fetch(place_id) -> dict | None on a miss.
+        """
+        details = self._get(place_id)
+        if details is not MISS:
+            self.stats["hits"] += 1
+            return details
+        self.stats["misses"] += 1
+        while True:
+            task = self._inflight.get(place_id)
+            if task is None:
+                # Как в кэше Nearby Search: общая загрузка не наследует срок и отмену запроса, который её начал
+                task = detach(self._load(place_id, fetch))
+                task.add_done_callback(functools.partial(self._loaded, place_id))
+                self._inflight[place_id] = task
+            else:
+                self.stats["coalesced"] += 1
+            try:
+                return await within("place_details", asyncio.shield(task))
+            except asyncio.CancelledError:
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+    async def get_many(self, place_ids, fetch, timeout=None) -> list:
+        """
+        Details for all place_ids fetched concurrently, in the same order. Best effort: a place whose
+        fetch fails or does not finish within `timeout` seconds gets None instead of failing the rest;
+        a late fetch keeps running and fills the cache for the next request.
+        """
+        tasks = [asyncio.ensure_future(self.get(place_id, fetch)) for place_id in place_ids]
+        if not tasks:
+            return []
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            # Перестаём ждать только мы: сама загрузка продолжается и попадёт в кэш
+            task.cancel()
+        self.stats["timeouts"] += len(pending)
+        results = []
+        for task in tasks:
+            if task in pending or task.cancelled():
+                results.append(None)
+            elif task.exception() is not None:
+                self.stats["failures"] += 1
+                results.append(None)
+            else:
+                results.append(task.result())
+        return results
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {**self.stats, "size": size}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def _load(self, place_id, fetch):
+        self.stats["fetches"] += 1
+        details = await fetch(place_id)
+        self._put(place_id, details)
+        return details
+
+    def _loaded(self, place_id, task):
+        if self._inflight.get(place_id) is task:
+            del self._inflight[place_id]
+        if not task.cancelled():
+            # Ошибку получают ожидающие; если никто не дождался, asyncio не пишет её в лог
+            task.exception()
+
+    def _get(self, place_id):
+        with self._lock:
+            entry = self._entries.get(place_id)
+            if entry is None:
+                return MISS
+            details, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[place_id]
+                return MISS
+            self._entries.move_to_end(place_id)
+            return details
+
+    def _put(self, place_id, details):
+        ttl = self.ttl if details is not None else self.negative_ttl
+        with self._lock:
+            self._entries[place_id] = (details, time.time() + ttl)
+            self._entries.move_to_end(place_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
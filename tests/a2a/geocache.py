@@ -0,0 +1,127 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Настройки кэша геокодинга
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.sqlite3")
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+GEOCODE_CACHE_NEGATIVE_TTL = float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL", str(3600)))
+GEOCODE_CACHE_MEMORY_SIZE = int(os.getenv("GEOCODE_CACHE_MEMORY_SIZE", "1024"))
+GEOCODE_CACHE_DISK_SIZE = int(os.getenv("GEOCODE_CACHE_DISK_SIZE", "100000"))
+
+# Маркер "в кэше ничего нет" (None означает закэшированную неудачу)
+MISS = object()
+
+_SPACES = re.compile(r"\s+")
+_PUNCT = re.compile(r"[\s.,;:!?\"'«»()]+$")
+
+def normalize_address(address: str) -> str:
+    key = _SPACES.sub(" ", address.strip().lower().replace("ё", "е"))
+    key = key.replace(" ,", ",")
+    return _PUNCT.sub("", key)
+
+class GeocodeCache:
+    """
+    Two-tier geocoding cache: in-process LRU in front of an SQLite table that survives restarts.
+    Values are (lat, lng) tuples; None marks a failed lookup (negative entry with its own TTL).
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL, negative_ttl=GEOCODE_CACHE_NEGATIVE_TTL,
+                 memory_size=GEOCODE_CACHE_MEMORY_SIZE, disk_size=GEOCODE_CACHE_DISK_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "key TEXT PRIMARY KEY, lat REAL, lng REAL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode (accessed_at)")
+        self._stores_since_evict = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "negative_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "disk_evictions": 0}
+
+    def get(self, address):
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    if value is None:
+                        self.stats["negative_hits"] += 1
+                    return value
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT lat, lng, expires_at FROM geocode WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    lat, lng, expires_at = row
+                    if expires_at > now:
+                        self._db.execute("UPDATE geocode SET accessed_at = ? WHERE key = ?", (now, key))
+                        value = None if lat is None else (lat, lng)
+                        self._remember(key, value, expires_at)
+                        self.stats["disk_hits"] += 1
+                        if value is None:
+                            self.stats["negative_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM geocode WHERE key = ?", (key,))
+            self.stats["misses"] += 1
+            return MISS
+
+    def set(self, address, value):
+        key = normalize_address(address)
+        now = time.time()
+        expires_at = now + (self.negative_ttl if value is None else self.ttl)
+        lat, lng = (None, None) if value is None else value
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode (key, lat, lng, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, lat, lng, expires_at, now),
+                )
+                self._stores_since_evict += 1
+                # COUNT(*) по всей таблице дорогой, поэтому проверяем размер не на каждой записи
+                if self._stores_since_evict >= 64:
+                    self._stores_since_evict = 0
+                    self._evict_disk()
+            self.stats["stores"] += 1
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM geocode").fetchone()
+        overflow = count - self.disk_size
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM geocode WHERE key IN (SELECT key FROM geocode ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.stats["disk_evictions"] += overflow
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from collections import deque
+
+# Хеджирование запросов: дубль уходит на реплику, если первый запрос дольше перцентиля недавних задержек
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))
+# Пока замеров меньше HEDGE_MIN_SAMPLES, порог берётся из HEDGE_DEFAULT_DELAY
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "2.0"))
+# Нижняя граница порога: на быстрых backend-ах дубли не должны уходить почти сразу
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+
+class LatencyTracker:
+    """
+    Rolling window of recent call latencies; the hedging threshold is a percentile of this window.
+    """
+
+    def __init__(self, window=HEDGE_WINDOW, min_samples=HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float):
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def hedge_delay(self, p=HEDGE_PERCENTILE, default=HEDGE_DEFAULT_DELAY, floor=HEDGE_MIN_DELAY) -> float:
+        value = self.percentile(p)
+        return max(floor, default if value is None else value)
+
+async def hedged(call, replicas, delay: float, accept=None):
+    """
+    Run call(replicas[0]); each time no acceptable result has arrived for `delay` seconds (or an attempt fails),
+    start call() on the next replica. The first acceptable result wins and the other attempts are cancelled.
+    Returns (result, index of the winning replica); if every attempt fails, the last failure is returned or raised.
+    """
+    accept = accept or (lambda result: True)
+    tasks = []
+    pending = set()
+    failed = None
+    try:
+        for attempt, replica in enumerate(replicas):
+            task = asyncio.ensure_future(call(replica))
+            tasks.append(task)
+            pending.add(task)
+            last = attempt == len(replicas) - 1
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=None if last else delay,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break  # медленно — запускаем дубль
+                for task in done:
+                    if task.exception() is None and accept(task.result()):
+                        return task.result(), tasks.index(task)
+                    failed = task
+                if not last:
+                    break  # попытка не удалась — сразу пробуем следующую реплику
+        return failed.result(), tasks.index(failed)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
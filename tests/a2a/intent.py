@@ -0,0 +1,119 @@
+import glob
+import os
+import re
+
+# Каталог со словарями ключевых слов: <label>.<lang>.txt, по одному термину/фразе на строку
+INTENT_KEYWORDS_DIR = os.getenv("INTENT_KEYWORDS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "keywords"))
+INTENT_DEFAULT_LABEL = os.getenv("INTENT_DEFAULT_LABEL", "qa")
+# Сколько окончаний из списка ниже может идти подряд после основы ("ресторан" -> "ресторан|ами",
+# "мейрамхан" -> "мейрамхан|а|лар|да"); произвольные буквы не допускаются: "паркур" и "картофель" — не "парк" и "карта"
+INTENT_MAX_ENDINGS = int(os.getenv("INTENT_MAX_ENDINGS", "3"))
+INTENT_MIN_STEM = 4
+# Короткие основы ("bar", "atm", "бар") допускают меньше окончаний подряд
+INTENT_SHORT_ENDINGS = 2
+
+# Окончания для отсечения при построении основ, от длинных к коротким
+_CYRILLIC_ENDINGS = sorted({
+    # русский
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ится", "ется", "ать", "ять", "ить",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ой", "ей", "ий", "ый", "ам", "ям", "ах", "ях", "ом", "ем", "ов", "ев",
+    "ую", "юю", "у", "ю", "а", "я", "о", "е", "ы", "и", "ь", "й",
+    # казахский
+    "лардың", "лердің", "дардың", "дердің", "тардың", "тердің", "ларға", "лерге", "ларда", "лерде",
+    "лар", "лер", "дар", "дер", "тар", "тер", "ның", "нің", "дың", "дің", "тың", "тің",
+    "ға", "ге", "қа", "ке", "да", "де", "та", "те", "ны", "ні", "ды", "ді", "ты", "ті", "нда", "нде", "сы", "сі",
+}, key=len, reverse=True)
+_LATIN_ENDINGS = sorted({"ings", "ing", "ies", "es", "ed", "s"}, key=len, reverse=True)
+
+_WORD = re.compile(r"\w+")
+_ENDING = "(?:" + "|".join(sorted(set(_CYRILLIC_ENDINGS) | set(_LATIN_ENDINGS), key=len, reverse=True)) + ")"
+_GAP = r"%s{0,%d}\s+" % (_ENDING, INTENT_MAX_ENDINGS)
+# Окончание после последней основы — один общий хвост всего выражения, а не копия в каждом листе дерева;
+# короткие основы дополнительно ограничены опережающей проверкой
+_TAIL = r"%s{0,%d}(?!\w)" % (_ENDING, INTENT_MAX_ENDINGS)
+_END = {"": "", "\0": r"(?=%s{0,%d}(?!\w))" % (_ENDING, INTENT_SHORT_ENDINGS)}
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower().replace("ё", "е")))
+
+def stem(word: str) -> str:
+    endings = _LATIN_ENDINGS if word.isascii() else _CYRILLIC_ENDINGS
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= INTENT_MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+def _trie_regex(trie: dict) -> str:
+    # Префиксное дерево основ -> регулярное выражение без повторов общих префиксов
+    alternatives = []
+    for char, child in sorted(trie.items()):
+        if char in _END:
+            continue
+        head = _GAP if char == " " else re.escape(char)
+        alternatives.append(head + _trie_regex(child))
+    alternatives.extend(_END[marker] for marker in _END if marker in trie)
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")"
+
+def compile_terms(terms) -> re.Pattern:
+    trie = {}
+    for term in terms:
+        stems = [stem(word) for word in normalize(term).split()]
+        if not stems:
+            continue
+        node = trie
+        for char in " ".join(stems):
+            node = node.setdefault(char, {})
+        node["" if len(stems[-1]) >= INTENT_MIN_STEM else "\0"] = {}
+    return re.compile(r"(?<!\w)" + _trie_regex(trie) + _TAIL)
+
+def load_keyword_files(directory: str = INTENT_KEYWORDS_DIR) -> dict:
+    keywords = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        label = os.path.basename(path).split(".")[0]
+        with open(path, encoding="utf-8") as f:
+            terms = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        keywords.setdefault(label, []).extend(terms)
+    return keywords
+
+class IntentClassifier:
+    """
+    Keyword router: all terms of a label are stemmed and compiled once into a single trie-shaped regex,
+    so classifying a query is one regex scan regardless of how many terms there are.
+    """
+
+    def __init__(self, keywords: dict, default: str = INTENT_DEFAULT_LABEL):
+        self.default = default
+        self.labels = [label for label, terms in keywords.items() if terms]
+        self._patterns = {label: compile_terms(keywords[label]) for label in self.labels}
+
+    @classmethod
+    def from_directory(cls, directory: str = INTENT_KEYWORDS_DIR, default: str = INTENT_DEFAULT_LABEL):
+        return cls(load_keyword_files(directory), default)
+
+    def classify(self, query: str) -> str:
+        text = query.lower().replace("ё", "е")
+        for label in self.labels:
+            if self._patterns[label].search(text):
+                return label
+        return self.default
+
+    def classify_with_confidence(self, query: str) -> tuple:
+        """
+        (label, confident). The pick is the same as classify(); it is confident only when exactly one label matched,
+        so queries matching several labels or none at all (default label) are reported as ambiguous.
+        """
+        text = query.lower().replace("ё", "е")
+        matched = [label for label in self.labels if self._patterns[label].search(text)]
+        if len(matched) == 1:
+            return matched[0], True
+        return (matched[0] if matched else self.default), False
+
+    def classify_many(self, queries) -> list:
+        classify = self.classify
+        return [classify(query) for query in queries]
+
+    def matches(self, query: str) -> dict:
+        text = query.lower().replace("ё", "е")
+        return {label: [m.group(0) for m in self._patterns[label].finditer(text)] for label in self.labels}
@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Нагрузочный тест всей связки router -> Q&A / Map в одном процессе:
+# LLM заменены детерминированными заглушками, Google Maps и Serper — локальным stub-сервером с задержкой.
+
+MAP_QUERIES = [
+    "cafes near Satpaev University",
+    "кафе рядом с Satpaev University",
+    "рестораны около Adi Sharipova, Almaty",
+    "аптека рядом с Abay Avenue 10, Almaty",
+    "мейрамхана жақын Dostyk Plaza",
+    "hotels near Almaty Arena",
+]
+QA_QUERIES = [
+    "Что такое onaitabu?",
+    "Как зарегистрироваться в приложении?",
+    "what is onaitabu",
+    "how do I register",
+    "Кто разработчики проекта?",
+]
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def build_upstream_app(maps_latency: float, serper_latency: float) -> Starlette:
+    async def geocode(request):
+        await asyncio.sleep(maps_latency)
+        return JSONResponse({"status": "OK", "results": [{"geometry": {"location": {"lat": 43.2364, "lng": 76.9300}}}]})
+
+    async def nearby(request):
+        await asyncio.sleep(maps_latency)
+        keyword = request.query_params.get("keyword", "place")
+        lat, lng = (float(x) for x in request.query_params["location"].split(","))
+        return JSONResponse({"status": "OK", "results": [
+            {
+                "place_id": f"{keyword}-{i}",
+                "name": f"{keyword.title()} #{i}",
+                "rating": round(3.5 + i * 0.1, 1),
+                "vicinity": f"{i} Abay Avenue, Almaty",
+                "geometry": {"location": {"lat": lat + i * 0.0005, "lng": lng - i * 0.0005}},
+            }
+            for i in range(1, 11)
+        ]})
+
+    async def details(request):
+        await asyncio.sleep(maps_latency)
+        place_id = request.query_params["place_id"]
+        return JSONResponse({"status": "OK", "result": {
+            "formatted_phone_number": "8 (727) 000-00-00",
+            "website": f"https://example.com/{place_id}",
+            "opening_hours": {"open_now": True, "weekday_text": ["Monday: 9:00 AM – 10:00 PM", "Tuesday: 9:00 AM – 10:00 PM"]},
+            "user_ratings_total": 120,
+            "reviews": [{"rating": 5, "text": "Вкусно и быстро, рекомендую."}],
+        }})
+
+    async def serper(request):
+        body = await request.json()
+        await asyncio.sleep(serper_latency)
+        return JSONResponse({"searchParameters": {"q": body.get("q")}, "organic": [{"title": body.get("q"), "link": "https://example.com"}]})
+
+    return Starlette(routes=[
+        Route("/maps/api/geocode/json", geocode),
+        Route("/maps/api/place/nearbysearch/json", nearby),
+        Route("/maps/api/place/details/json", details),
+        Route("/search", serper, methods=["POST"]),
+    ])
+
+def build_fake_qa_agent(latency: float):
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelResponse, ToolCallPart
+    from pydantic_ai.models.function import FunctionModel, DeltaToolCall
+    from question_answer import AppAgentOutput
+
+    def output(messages):
+        question = messages[-1].parts[-1].content
+        return json.dumps({"answer": f"Ответ на вопрос: {question}", "source": "pdf"}, ensure_ascii=False)
+
+    async def function(messages, info):
+        await asyncio.sleep(latency)
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, output(messages))])
+
+    async def stream_function(messages, info):
+        args = output(messages)
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args="")}
+        for i in range(0, len(args), 8):
+            await asyncio.sleep(latency * 8 / len(args))
+            yield {0: DeltaToolCall(json_args=args[i:i + 8])}
+
+    return Agent(FunctionModel(function, stream_function=stream_function), output_type=AppAgentOutput)
+
+def build_fake_extractor(latency: float):
+    from google.adk.models import BaseLlm, LlmResponse
+    from google.genai import types
+
+    # "cafes near Satpaev University" -> {"place_type": "cafes", "location": "Satpaev University", "radius": 500}
+    pattern = re.compile(r"^(?P<place>.+?)\s+(?:near|рядом с|около|жақын)\s+(?P<location>.+)$", re.IGNORECASE)
+
+    class FakePlaceExtractor(BaseLlm):
+        async def generate_content_async(self, llm_request, stream=False):
+            await asyncio.sleep(latency)
+            text = llm_request.contents[-1].parts[0].text
+            match = pattern.match(text.strip())
+            place, location = (match["place"], match["location"]) if match else (text, "Almaty")
+            payload = json.dumps({"place_type": place, "location": location, "radius": 500}, ensure_ascii=False)
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=payload)]))
+
+    return FakePlaceExtractor(model="fake-extractor")
+
+def boot(args) -> list:
+    tmp = tempfile.mkdtemp(prefix="onaitabu-loadtest-")
+    upstream = f"http://127.0.0.1:{args.upstream_port}"
+    os.environ.update({
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "loadtest"),
+        "GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAPS_API_KEY", "loadtest"),
+        "GOOGLE_MAPS_BASE_URL": upstream,
+        "SERPER_BASE_URL": upstream,
+        "GEOCODE_CACHE_PATH": os.path.join(tmp, "geocode.sqlite3"),
+        "VECTOR_STORE_MANIFEST": os.path.join(tmp, "manifest.json"),
+        "ANSWER_QUESTION_URL": f"http://127.0.0.1:{args.qa_port}",
+        "MAP_URL": f"http://127.0.0.1:{args.map_port}",
+    })
+
+    # Q&A: вместо сборки агента с vector store — детерминированная модель
+    import answer_question_server
+    answer_question_server._agent.set(build_fake_qa_agent(args.qa_latency))
+
+    # Map: извлечение PlaceType без Gemini
+    import map as map_module
+    map_module.llm_agent.get().model = build_fake_extractor(args.extract_latency)
+    import map_server
+    import router_server
+
+    return [
+        serve_in_thread(build_upstream_app(args.maps_latency, args.serper_latency), args.upstream_port),
+        serve_in_thread(answer_question_server.app, args.qa_port),
+        serve_in_thread(map_server.app, args.map_port),
+        serve_in_thread(router_server.app, args.router_port),
+    ]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def drive(args) -> tuple:
+    import httpx
+
+    rng = random.Random(args.seed)
+    results = []  # (route, latency, ok)
+    url = f"http://127.0.0.1:{args.router_port}/"
+    total = int(args.rate * args.duration)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        async def one(i):
+            route = "map" if rng.random() < args.map_ratio else "qa"
+            query = rng.choice(MAP_QUERIES if route == "map" else QA_QUERIES)
+            if args.unique:
+                query = f"{query} #{i}"
+            payload = {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "message/send",
+                "params": {
+                    "message": {
+                        "kind": "message",
+                        "messageId": uuid.uuid4().hex,
+                        "role": "user",
+                        "parts": [{"kind": "text", "text": query}],
+                    },
+                    "configuration": {"acceptedOutputModes": ["text/plain"]},
+                },
+            }
+            start = time.perf_counter()
+            try:
+                resp = await client.post(url, json=payload)
+                data = resp.json()
+                text = (data.get("result") or {}).get("parts", [{}])[0].get("text", "")
+                ok = resp.status_code == 200 and "error" not in data and not text.startswith("Ошибка")
+            except Exception:
+                ok = False
+            results.append((route, time.perf_counter() - start, ok))
+
+        # Открытая модель нагрузки: запросы уходят по расписанию, не дожидаясь ответов
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(i)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+def report(results, elapsed):
+    print(f"{'route':6} {'sent':>6} {'errors':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for route in ("map", "qa", "all"):
+        rows = [r for r in results if route == "all" or r[0] == route]
+        if not rows:
+            continue
+        latencies = sorted(r[1] * 1000 for r in rows if r[2])
+        errors = sum(1 for r in rows if not r[2])
+        print(f"{route:6} {len(rows):6d} {errors:6d} {len(latencies) / elapsed:8.1f} "
+              f"{percentile(latencies, 50):9.1f} {percentile(latencies, 95):9.1f} "
+              f"{percentile(latencies, 99):9.1f} {max(latencies, default=float('nan')):9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load test of the router, Q&A and Map A2A servers with stub LLMs and upstreams")
+    parser.add_argument("--rate", type=float, default=50, help="requests per second sent to the router")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic")
+    parser.add_argument("--map-ratio", type=float, default=0.5, help="share of map queries in the mix")
+    parser.add_argument("--unique", action="store_true", help="make every query unique to bypass answer/geocode caches")
+    parser.add_argument("--qa-latency", type=float, default=0.5, help="stub Q&A model latency, seconds")
+    parser.add_argument("--extract-latency", type=float, default=0.3, help="stub place extractor latency, seconds")
+    parser.add_argument("--maps-latency", type=float, default=0.08, help="stub Google Maps latency, seconds")
+    parser.add_argument("--serper-latency", type=float, default=0.2, help="stub Serper latency, seconds")
+    parser.add_argument("--connections", type=int, default=200, help="client connection pool size")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--router-port", type=int, default=8100)
+    parser.add_argument("--qa-port", type=int, default=8101)
+    parser.add_argument("--map-port", type=int, default=8102)
+    parser.add_argument("--upstream-port", type=int, default=8103)
+    args = parser.parse_args()
+
+    servers = boot(args)
+    try:
+        results, elapsed = asyncio.run(drive(args))
+        report(results, elapsed)
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+if __name__ == "__main__":
+    main()
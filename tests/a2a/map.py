@@ -1,19 +1,41 @@
 import os
-import requests
+import re
+import httpx
 from dotenv import load_dotenv
-from google.adk.agents import LlmAgent
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
 import asyncio
 import json
 from pydantic import BaseModel, Field
+from geocache import GeocodeCache, MISS
+from placescache import PlacesCache
+from detailscache import PlaceDetailsCache
+from places import parse_places
+from place_rules import PlaceRuleExtractor
+from serving import Lazy
+from metrics import record_upstream
+from resilience import CircuitBreaker, DeadlineExceeded, budget, cut_by_deadline
 # Load API key from .env
 load_dotenv()
 API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 
-if not API_KEY:
-    raise ValueError("GOOGLE_MAPS_API_KEY not found in .env file.")
+# Google Maps HTTP client settings
+MAPS_BASE_URL = os.getenv('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com')
+MAPS_TIMEOUT = float(os.getenv('GOOGLE_MAPS_TIMEOUT', '10'))
+MAPS_POOL_SIZE = int(os.getenv('GOOGLE_MAPS_POOL_SIZE', '50'))
+MAPS_MAX_CONCURRENCY = int(os.getenv('GOOGLE_MAPS_MAX_CONCURRENCY', '32'))
+# Cache whole nearby-search answers per (point, place type, radius); off by default, set to 1 to enable
+PLACES_CACHE = os.getenv('PLACES_CACHE', '0') not in ('0', 'false', 'False', '')
+# Places shown per place type; search results beyond them are never projected or kept
+MAP_TOP_PLACES = int(os.getenv('MAP_TOP_PLACES', '5'))
+# Place Details for the top results of every answer (0 disables enrichment); only the masked fields are requested
+PLACE_DETAILS_TOP = int(os.getenv('PLACE_DETAILS_TOP', '3'))
+PLACE_DETAILS_FIELDS = os.getenv(
+    'PLACE_DETAILS_FIELDS', 'formatted_phone_number,website,opening_hours,editorial_summary,user_ratings_total,reviews')
+# Details that take longer than this are left out of the answer (they are still cached when they arrive)
+PLACE_DETAILS_TIMEOUT = float(os.getenv('PLACE_DETAILS_TIMEOUT', '2'))
+PLACE_DETAILS_LANGUAGE = os.getenv('PLACE_DETAILS_LANGUAGE', '')
+PLACE_DETAILS_SUMMARY_CHARS = 160
+# Upper bound for one Gemini extraction call; the request deadline can cut it shorter
+MAP_LLM_TIMEOUT = float(os.getenv('MAP_LLM_TIMEOUT', '20'))
 
 # ADK constants
 APP_NAME = "onaitabu_map"
@@ -27,59 +49,211 @@ class PlaceType(BaseModel):
 
 
 # Initialize Gemini LLM agent (ensure Gemini API key is set up as per ADK docs)
-llm_agent = LlmAgent(
-    model="gemini-2.0-flash",
-    name="place_extractor_agent",
-    description="Extracts place type and location from user queries about places.",
-    instruction="""You are an assistant that extracts structured information from user queries about places.\nGiven a prompt like 'best cafes near Satpaev University', extract the place(with full information, including specific information about the place) type and location(formatted as a full address).""",
-    output_schema=PlaceType
-)
+def build_llm_agent():
+    # google.adk takes seconds to import; rule-parsed queries never need it
+    from google.adk.agents import LlmAgent
+    return LlmAgent(
+        model="gemini-2.0-flash",
+        name="place_extractor_agent",
+        description="Extracts place type and location from user queries about places.",
+        instruction="""You are an assistant that extracts structured information from user queries about places.\nGiven a prompt like 'best cafes near Satpaev University', extract the place(with full information, including specific information about the place) type and location(formatted as a full address).""",
+        output_schema=PlaceType
+    )
+
+# Built on first Gemini fallback or by the server warm-up
+llm_agent = Lazy(build_llm_agent)
+
+# Rule-based extractor for formulaic queries; Gemini is only used when it returns None
+place_rules = PlaceRuleExtractor.from_directory()
+
+# Two-tier (LRU + SQLite) cache of geocoding results shared by all requests
+geocode_cache = GeocodeCache()
+
+# Nearby-search answers by point, place type and radius
+places_cache = PlacesCache()
+
+# Projected Place Details by place_id
+details_cache = PlaceDetailsCache()
+
+# Fail fast while Google Maps or Gemini keep failing instead of tying up requests on them
+maps_breaker = CircuitBreaker('google_maps')
+gemini_breaker = CircuitBreaker('gemini')
+
+# Shared pooled client for all Google Maps calls, created lazily inside the running loop
+_maps_client = None
+_maps_semaphore = None
+
+def get_maps_client():
+    global _maps_client, _maps_semaphore
+    if _maps_client is None or _maps_client.is_closed:
+        _maps_client = httpx.AsyncClient(
+            base_url=MAPS_BASE_URL,
+            limits=httpx.Limits(max_connections=MAPS_POOL_SIZE, max_keepalive_connections=MAPS_POOL_SIZE),
+            timeout=httpx.Timeout(MAPS_TIMEOUT),
+        )
+        _maps_semaphore = asyncio.Semaphore(MAPS_MAX_CONCURRENCY)
+    return _maps_client
+
+async def close_maps_client():
+    global _maps_client
+    if _maps_client is not None:
+        await _maps_client.aclose()
+        _maps_client = None
+
+async def _maps_get(path, params):
+    if not API_KEY:
+        raise ValueError("GOOGLE_MAPS_API_KEY not found in .env file.")
+    client = get_maps_client()
+    async with _maps_semaphore:
+        # The timeout never outlives the request deadline; time spent waiting for the semaphore counts too
+        timeout = budget('google_maps', MAPS_TIMEOUT)
+        with maps_breaker.guard():
+            try:
+                resp = await client.get(path, params={**params, 'key': API_KEY}, timeout=timeout)
+            except httpx.TimeoutException:
+                record_upstream('google_maps', 'timeout')
+                if cut_by_deadline('google_maps', timeout, MAPS_TIMEOUT):
+                    raise DeadlineExceeded('Deadline exceeded while waiting for google_maps', timeout) from None
+                raise
+            except httpx.HTTPError:
+                record_upstream('google_maps', 'error')
+                raise
+            record_upstream('google_maps', 'ok' if resp.is_success else 'error')
+            resp.raise_for_status()
+    return resp.json()
 
 # Step 1: Geocode the location to get lat/lng
-def geocode_location(location):
-    url = f'https://maps.googleapis.com/maps/api/geocode/json'
-    params = {'address': location, 'key': API_KEY}
-    resp = requests.get(url, params=params)
-    data = resp.json()
+async def geocode_location(location):
+    cached = geocode_cache.get(location)
+    if cached is not MISS:
+        if cached is None:
+            raise ValueError(f"Could not geocode location: {location}")
+        return cached
+    data = await _maps_get('/maps/api/geocode/json', {'address': location})
     if data['status'] == 'OK':
         loc = data['results'][0]['geometry']['location']
+        geocode_cache.set(location, (loc['lat'], loc['lng']))
         return loc['lat'], loc['lng']
     else:
+        # Cache only definitive failures, not quota/transient errors
+        if data['status'] == 'ZERO_RESULTS':
+            geocode_cache.set(location, None)
         raise ValueError(f"Could not geocode location: {location}")
 
 # Step 2: Search for places nearby
-def search_places(lat, lng, place_type, radius):
-    url = f'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
+async def search_places(lat, lng, place_type, radius, limit=MAP_TOP_PLACES):
+    """
+    The top `limit` places as compact Place records (the full Places JSON is dropped right after parsing).
+    """
+    if PLACES_CACHE:
+        return await places_cache.search(lat, lng, place_type, radius, _nearby_search, limit=limit)
+    return await _nearby_search(lat, lng, place_type, radius, limit)
+
+async def _nearby_search(lat, lng, place_type, radius, limit=None):
     params = {
         'location': f'{lat},{lng}',
         'radius': radius,  # meters
         'keyword': place_type,
-        'key': API_KEY,
         'rankby': 'prominence',
     }
-    resp = requests.get(url, params=params)
-    data = resp.json()
+    data = await _maps_get('/maps/api/place/nearbysearch/json', params)
     if data['status'] == 'OK':
-        return data['results']
+        return parse_places(data['results'], limit)
+    elif data['status'] == 'ZERO_RESULTS':
+        return []
     else:
         raise ValueError(f"Places API error: {data['status']}")
 
+# Step 2b: Enrich the top results with Place Details (hours, phone, website, reviews summary)
+async def place_details(place_id):
+    params = {'place_id': place_id, 'fields': PLACE_DETAILS_FIELDS}
+    if PLACE_DETAILS_LANGUAGE:
+        params['language'] = PLACE_DETAILS_LANGUAGE
+    data = await _maps_get('/maps/api/place/details/json', params)
+    if data['status'] == 'OK':
+        return _project_details(data['result'])
+    elif data['status'] == 'NOT_FOUND':
+        return None
+    else:
+        raise ValueError(f"Place Details API error: {data['status']}")
+
+def _project_details(result):
+    # Keep only what the answer shows: a cached entry is a few hundred bytes instead of the full payload with reviews
+    summary = (result.get('editorial_summary') or {}).get('overview')
+    if not summary:
+        texts = [review.get('text', '').strip() for review in result.get('reviews') or []]
+        summary = next((text for text in texts if text), None)
+    if summary and len(summary) > PLACE_DETAILS_SUMMARY_CHARS:
+        summary = summary[:PLACE_DETAILS_SUMMARY_CHARS].rsplit(' ', 1)[0] + '…'
+    return {
+        'phone': result.get('formatted_phone_number'),
+        'website': result.get('website'),
+        'hours': (result.get('opening_hours') or {}).get('weekday_text') or [],
+        'reviews': result.get('user_ratings_total'),
+        'summary': summary,
+    }
+
+async def enrich_places(places, top=PLACE_DETAILS_TOP):
+    """
+    Place Details for the first `top` places, fetched concurrently and cached by place_id.
+    A place whose details fail or are late gets None, so enrichment never fails the answer.
+    """
+    place_ids = [place.place_id for place in places[:top]]
+    try:
+        timeout = budget('place_details', PLACE_DETAILS_TIMEOUT)
+    except DeadlineExceeded:
+        # The places are already found; an exhausted deadline only costs the details
+        return [None] * len(place_ids)
+    details = await details_cache.get_many([pid for pid in place_ids if pid], place_details, timeout=timeout)
+    found = iter(details)
+    return [next(found) if pid else None for pid in place_ids]
+
+def format_details(details):
+    if not details:
+        return ''
+    lines = []
+    contacts = ' · '.join(value for value in (details['phone'], details['website']) if value)
+    if contacts:
+        lines.append(f"\n   {contacts}")
+    if details['hours']:
+        lines.append(f"\n   Hours: {'; '.join(details['hours'])}")
+    if details['summary']:
+        reviews = f" ({details['reviews']} reviews)" if details['reviews'] else ''
+        lines.append(f"\n   About{reviews}: {details['summary']}")
+    return ''.join(lines)
+
+# "cafes, bars and restaurants" -> ["cafes", "bars", "restaurants"]; "Chef and Sweets" is a venue name and stays whole
+_PLACE_TYPE_SEPARATORS = re.compile(r'\s*(?:[,;/]|\band\b|\bи\b|\bжәне\b)\s*', re.IGNORECASE)
+
+def split_place_types(place_type):
+    parts = [t for t in _PLACE_TYPE_SEPARATORS.split(place_type) if t.strip()]
+    # Split only when every part is a known place type (keywords/places); anything else may be part of a name
+    if len(parts) > 1 and all(place_rules.is_place_type(t) for t in parts):
+        return parts
+    return [place_type]
+
+async def search_places_many(lat, lng, place_types, radius):
+    """
+    Run one nearby search per place type concurrently around the same point.
+    """
+    return await asyncio.gather(*(search_places(lat, lng, t, radius) for t in place_types))
+
 # Step 3: Format and print results
-def print_places(places):
-    for i, place in enumerate(places[:5], 1):
+def print_places(places, details=()):
+    details = list(details)
+    for i, place in enumerate(places[:MAP_TOP_PLACES], 1):
         print(place)
-        name = place.get('name')
-        address = place.get('vicinity')
-        rating = place.get('rating', 'N/A')
-        print(f"{i}. {name} (Rating: {rating}) - {address}")
+        rating = place.rating if place.rating is not None else 'N/A'
+        print(f"{i}. {place.name} (Rating: {rating}) - {place.vicinity}{format_details(details[i - 1] if i <= len(details) else None)}")
 
-async def parse_prompt(prompt, runner):
+async def parse_prompt(prompt, runner, user_id=USER_ID, session_id=SESSION_ID):
     """
     Use Gemini LLM agent to extract place_type, location, and radius from the prompt.
     """
+    from google.genai import types
     content = types.Content(role='user', parts=[types.Part(text=prompt)])
-    events = runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
-    for event in events:
+    events = runner.run_async(user_id=user_id, session_id=session_id, new_message=content)
+    async for event in events:
         if event.is_final_response():
             result = event.content.parts[0].text.strip()
             if not result:
@@ -96,20 +270,26 @@ async def parse_prompt(prompt, runner):
     return None, None, None
 
 async def main():
-    session_service = InMemorySessionService()
+    from google.adk.runners import Runner
+    from session_store import BoundedSessionService
+    session_service = BoundedSessionService()
     await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-    runner = Runner(agent=llm_agent, app_name=APP_NAME, session_service=session_service)
+    runner = Runner(agent=llm_agent.get(), app_name=APP_NAME, session_service=session_service)
 
     prompt = input("Enter your prompt (e.g. 'best cafes near Satpaev University'): ")
-    place_type, location, radius = await parse_prompt(prompt, runner)
+    place_type, location, radius = place_rules.extract(prompt) or await parse_prompt(prompt, runner)
     print(place_type, location, radius)
     if not place_type or not location or not radius:
         print("Could not extract place type, location, or radius from the prompt.")
         return
-    lat, lng = geocode_location(location)
-    places = search_places(lat, lng, place_type, radius)
-    print(f"\nTop {place_type.title()} near {location} (radius: {radius}m):")
-    print_places(places)
+    lat, lng = await geocode_location(location)
+    place_types = split_place_types(place_type)
+    results = await search_places_many(lat, lng, place_types, radius)
+    enriched = await asyncio.gather(*(enrich_places(places) for places in results))
+    for place_type, places, details in zip(place_types, results, enriched):
+        print(f"\nTop {place_type.title()} near {location} (radius: {radius}m):")
+        print_places(places, details)
+    await close_maps_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,40 +1,108 @@
 import os
-from a2a.types import AgentCard, AgentSkill, AgentCapabilities, Message, MessageSendParams, Task, Role, Part, TextPart
+from a2a.types import AgentCard, AgentSkill, AgentCapabilities, Message, MessageSendParams, Task, Role, Part, TextPart, JSONRPCError
 from a2a.server.request_handlers.request_handler import RequestHandler
+from a2a.utils.errors import ServerError
 from a2a.server.apps import A2AStarletteApplication
-import uvicorn
 import asyncio
-from map import llm_agent, InMemorySessionService, Runner, parse_prompt, geocode_location, search_places
+import uuid
+from contextlib import asynccontextmanager
+from map import (
+    llm_agent, parse_prompt, geocode_location, search_places, enrich_places, format_details,
+    split_place_types, close_maps_client, places_cache, details_cache, place_rules, gemini_breaker, API_KEY, APP_NAME, USER_ID,
+    MAP_LLM_TIMEOUT, MAP_TOP_PLACES,
+)
+from session_pool import SessionPool
+from metrics import REGISTRY, metrics_route, span, in_flight, trace, trace_id_from
+from serving import Lazy, Readiness, serve
+from resilience import (
+    DEADLINE_EXCEEDED_ERROR_CODE, UNAVAILABLE_ERROR_CODE, CircuitOpen, DeadlineExceeded, deadline, deadline_from, within,
+)
+
+class Extractor:
+    # Runner и session service создаются один раз и живут всё время работы сервера
+    def __init__(self):
+        from google.adk.runners import Runner
+        from session_store import BoundedSessionService
+        self.session_service = BoundedSessionService()
+        self.runner = Runner(agent=llm_agent.get(), app_name=APP_NAME, session_service=self.session_service)
+        self.session_pool = SessionPool(self.session_service, APP_NAME, USER_ID)
+
+# google.adk импортируется при прогреве воркера или первом запросе, которому нужен Gemini; шаблонные запросы обходятся без него
+extractor = Lazy(Extractor)
 
-# ADK constants (дублируем для удобства)
-APP_NAME = "onaitabu_map"
-USER_ID = "user_map"
-SESSION_ID = "map_session_1"
+# Статистика кэша Nearby Search и быстрого разбора запросов в /metrics
+def _collect_stats():
+    sources = [("onaitabu_places_cache", places_cache.snapshot()),
+               ("onaitabu_place_details_cache", details_cache.snapshot()), ("onaitabu_place_rules", place_rules.snapshot())]
+    if extractor.ready:
+        sources += [("onaitabu_adk_sessions", extractor.get().session_service.snapshot()),
+                    ("onaitabu_session_pool", extractor.get().session_pool.stats)]
+    for prefix, stats in sources:
+        for key, value in stats.items():
+            yield f"{prefix}_{key}", {}, value
 
-async def map_logic(query: str) -> str:
-    session_service = InMemorySessionService()
-    await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-    runner = Runner(agent=llm_agent, app_name=APP_NAME, session_service=session_service)
-    place_type, location, radius = await parse_prompt(query, runner)
+REGISTRY.add_collector(_collect_stats)
+
+async def _search_section(lat, lng, place_type, radius):
+    with span("map", "search_places"):
+        places = await search_places(lat, lng, place_type, radius)
+    # Детали лучших мест запрашиваются сразу после поиска, параллельно с остальными секциями
+    with span("map", "place_details"):
+        details = await enrich_places(places)
+    return places, details
+
+async def map_stream(query: str, session_key: str | None = None):
+    # Шаблонные запросы разбираются правилами, Gemini вызывается только если они не справились
+    with span("map", "parse_rules"):
+        parsed = place_rules.extract(query)
+    if parsed is None:
+        # Без ключа — одноразовая сессия на запрос, с ключом (contextId) — сессия на диалог
+        with span("map", "parse_prompt"):
+            gemini = await extractor.aget()
+            async with gemini.session_pool.session(session_key) as session_id:
+                with gemini_breaker.guard():
+                    parsed = await within("gemini", parse_prompt(query, gemini.runner, session_id=session_id), MAP_LLM_TIMEOUT)
+    place_type, location, radius = parsed
     if not place_type or not location or not radius:
-        return "Could not extract place type, location, or radius from the prompt."
-    lat, lng = geocode_location(location)
-    places = search_places(lat, lng, place_type, radius)
-    if not places:
-        return f"No places found for '{place_type}' near '{location}'."
-    # Формируем краткий текстовый ответ
-    lines = []
-    for i, place in enumerate(places[:5], 1):
-        name = place.get('name')
-        address = place.get('vicinity')
-        rating = place.get('rating', 'N/A')
-        lines.append(f"{i}. {name} (Rating: {rating}) - {address}")
-    return f"Top {place_type.title()} near {location} (radius: {radius}m):\n" + "\n".join(lines)
+        yield "Could not extract place type, location, or radius from the prompt."
+        return
+    with span("map", "geocode_location"):
+        lat, lng = await geocode_location(location)
+    # Несколько типов мест в одном запросе ищем параллельно, выдаём секции по порядку
+    place_types = split_place_types(place_type)
+    searches = [asyncio.ensure_future(_search_section(lat, lng, t, radius)) for t in place_types]
+    try:
+        for n, (place_type, search) in enumerate(zip(place_types, searches)):
+            separator = "\n\n" if n else ""
+            places, details = await search
+            if not places:
+                yield f"{separator}No places found for '{place_type}' near '{location}'."
+                continue
+            yield f"{separator}Top {place_type.title()} near {location} (radius: {radius}m):"
+            # Каждую строку отдаём сразу после форматирования
+            for i, place in enumerate(places[:MAP_TOP_PLACES], 1):
+                rating = place.rating if place.rating is not None else 'N/A'
+                yield f"\n{i}. {place.name} (Rating: {rating}) - {place.vicinity}{format_details(details[i - 1] if i <= len(details) else None)}"
+    finally:
+        for search in searches:
+            search.cancel()
+
+async def map_logic(query: str, session_key: str | None = None) -> str:
+    return "".join([chunk async for chunk in map_stream(query, session_key)])
+
+def _resilience_error(e: Exception) -> ServerError:
+    if isinstance(e, CircuitOpen):
+        return ServerError(error=JSONRPCError(code=UNAVAILABLE_ERROR_CODE, message=str(e), data={"retry_after": e.retry_after}))
+    return ServerError(error=JSONRPCError(code=DEADLINE_EXCEEDED_ERROR_CODE, message=str(e)))
 
 class MapHandler(RequestHandler):
     async def on_message_send(self, params: MessageSendParams, context=None):
         user_message = params.message.parts[0].root.text
-        result = await map_logic(user_message)
+        try:
+            with trace(trace_id_from(params, context)), deadline(deadline_from(params, context)), in_flight("map"):
+                result = await map_logic(user_message, params.message.contextId)
+        except (DeadlineExceeded, CircuitOpen) as e:
+            raise _resilience_error(e)
         return Message(
             messageId="1",
             role=Role.agent,
@@ -46,7 +114,19 @@ class MapHandler(RequestHandler):
     async def on_cancel_task(self, params, context=None):
         return None
     async def on_message_send_stream(self, params, context=None):
-        return
+        user_message = params.message.parts[0].root.text
+        message_id = uuid.uuid4().hex
+        try:
+            with trace(trace_id_from(params, context)), deadline(deadline_from(params, context)), in_flight("map"):
+                async for chunk in map_stream(user_message, params.message.contextId):
+                    yield Message(
+                        messageId=message_id,
+                        role=Role.agent,
+                        parts=[Part(root=TextPart(text=chunk))],
+                        kind="message"
+                    )
+        except (DeadlineExceeded, CircuitOpen) as e:
+            raise _resilience_error(e)
     async def on_set_task_push_notification_config(self, params, context=None):
         return None
     async def on_get_task_push_notification_config(self, params, context=None):
@@ -59,7 +139,7 @@ agent_card = AgentCard(
     description="Поиск по картам и местам",
     version="1.0",
     url="http://localhost:8002",
-    capabilities=AgentCapabilities(),
+    capabilities=AgentCapabilities(streaming=True),
     defaultInputModes=["text/plain"],
     defaultOutputModes=["text/plain"],
     skills=[
@@ -72,8 +152,20 @@ agent_card = AgentCard(
     ]
 )
 
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_maps_client()
+
+# Воркер готов сразу: правила работают без Gemini, а ADK догружается в фоне (SERVER_WARMUP).
+# Без ключа Google Maps воркер в ротацию не попадает
+readiness = Readiness("map", checks={"google_maps_key": lambda: bool(API_KEY)}, warmup=extractor.get)
 handler = MapHandler()
-app = A2AStarletteApplication(agent_card=agent_card, http_handler=handler).build()
+app = A2AStarletteApplication(agent_card=agent_card, http_handler=handler).build(
+    lifespan=readiness.lifespan(lifespan),
+    routes=[metrics_route, readiness.route],
+)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002) 
\ No newline at end of file
+    # SERVER_WORKERS=auto — по воркеру на ядро
+    serve(app, "map_server:app", port=8002)
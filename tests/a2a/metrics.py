@@ -0,0 +1,176 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+try:
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+except ImportError:  # CLI-скрипты (serper_search.py) без серверного стека: счётчики работают, /metrics не нужен
+    Route = None
+
+# Метрики в формате Prometheus и тайминги этапов обработки запроса
+logger = logging.getLogger("onaitabu.trace")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace ID текущего запроса; роутер передаёт его backend-агентам в metadata сообщения
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(v[0]), v[1]) for k, v in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collect):
+        # collect() -> [(name, {labels}, value)]; для значений, которые уже считаются в другом месте (кэш, очередь)
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = Histogram("onaitabu_stage_latency_seconds", "Latency of a request processing stage", ("service", "stage"))
+STAGE_ERRORS = Counter("onaitabu_stage_errors_total", "Stages that raised an exception", ("service", "stage"))
+IN_FLIGHT = Gauge("onaitabu_in_flight_requests", "Requests currently being handled", ("service",))
+UPSTREAM_REQUESTS = Counter("onaitabu_upstream_requests_total", "Calls to upstream services by outcome", ("upstream", "outcome"))
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+@contextmanager
+def trace(trace_id=None):
+    token = trace_id_var.set(trace_id or new_trace_id())
+    try:
+        yield trace_id_var.get()
+    finally:
+        trace_id_var.reset(token)
+
+@contextmanager
+def span(service, stage):
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        STAGE_ERRORS.inc(service, stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.observe(duration, service, stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"trace_id": trace_id_var.get(), "service": service, "stage": stage,
+                                     "duration_ms": round(duration * 1000, 3), "ok": ok}))
+
+@contextmanager
+def in_flight(service):
+    IN_FLIGHT.inc(service)
+    try:
+        yield
+    finally:
+        IN_FLIGHT.dec(service)
+
+def record_upstream(upstream, outcome):
+    UPSTREAM_REQUESTS.inc(upstream, outcome)
+
+def trace_id_from(params, context=None):
+    # Сначала metadata сообщения (A2A), затем заголовок X-Trace-Id
+    metadata = params.message.metadata or {}
+    if metadata.get("trace_id"):
+        return metadata["trace_id"]
+    headers = getattr(context, "state", {}).get("headers", {}) if context is not None else {}
+    return headers.get("x-trace-id")
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+metrics_route = Route("/metrics", metrics_endpoint, methods=["GET"]) if Route is not None else None
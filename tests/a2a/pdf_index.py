@@ -0,0 +1,241 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from intent import normalize, stem
+from question_answer import file_sha256
+from serving import file_lock
+
+# Локальный поисковый индекс по PDF: BM25 (+ опционально эмбеддинги) в одном memory-mapped файле
+PDF_INDEX_PATH = os.getenv("PDF_INDEX_PATH", "data/project_info.idx")
+PDF_INDEX_TOP_K = int(os.getenv("PDF_INDEX_TOP_K", "4"))
+PDF_INDEX_EMBEDDING_MODEL = os.getenv("PDF_INDEX_EMBEDDING_MODEL")
+PDF_CHUNK_WORDS = int(os.getenv("PDF_CHUNK_WORDS", "120"))
+PDF_CHUNK_OVERLAP = int(os.getenv("PDF_CHUNK_OVERLAP", "30"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_MAGIC = b"OPDFIDX1"
+_HEADER = struct.Struct("<8sI")
+_SENTENCE_END = re.compile(r"(?<=[.!?…:;])\s+|\n\s*\n")
+
+def tokenize(text: str) -> list:
+    return [stem(word) for word in normalize(text).split()]
+
+def extract_pages(pdf_path: str) -> list:
+    # pypdf нужен только для построения индекса, поиск работает без него
+    from pypdf import PdfReader
+    return [page.extract_text() or "" for page in PdfReader(pdf_path).pages]
+
+def chunk_pages(pages, max_words=PDF_CHUNK_WORDS, overlap=PDF_CHUNK_OVERLAP) -> list:
+    """
+    Split page texts into overlapping windows of about max_words words, cut on sentence boundaries.
+    Returns [(page_number, text)] with 1-based page numbers.
+    """
+    chunks = []
+    for page_number, text in enumerate(pages, 1):
+        sentences = [" ".join(s.split()) for s in _SENTENCE_END.split(text) if s.strip()]
+        window, words = [], 0
+        for sentence in sentences:
+            size = len(sentence.split())
+            if window and words + size > max_words:
+                chunks.append((page_number, " ".join(window)))
+                # Хвост предыдущего окна повторяется в начале следующего
+                while window and words > overlap:
+                    words -= len(window.pop(0).split())
+            window.append(sentence)
+            words += size
+        if window:
+            chunks.append((page_number, " ".join(window)))
+    return chunks
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % 8))
+    return f.tell()
+
+def write_index(path: str, chunks, pdf_sha256: str, vectors=None) -> None:
+    """
+    Write a BM25 index over chunks ([(page, text)]) to path, atomically.
+    vectors (one embedding per chunk) are stored L2-normalized as float32 for hybrid search.
+    """
+    postings = {}
+    doc_lengths = array("I")
+    for doc_id, (_, text) in enumerate(chunks):
+        tokens = tokenize(text)
+        doc_lengths.append(len(tokens))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings.setdefault(token, []).append((doc_id, tf))
+
+    vocab, doc_ids, tfs = {}, array("I"), array("H")
+    for term in sorted(postings):
+        vocab[term] = (len(doc_ids), len(postings[term]))
+        for doc_id, tf in postings[term]:
+            doc_ids.append(doc_id)
+            tfs.append(min(tf, 0xFFFF))
+
+    texts = [text.encode("utf-8") for _, text in chunks]
+    text_offsets = array("Q", [0])
+    for blob in texts:
+        text_offsets.append(text_offsets[-1] + len(blob))
+    pages = array("H", (page for page, _ in chunks))
+
+    dim = len(vectors[0]) if vectors else 0
+    embeddings = array("f")
+    for vector in vectors or ():
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        embeddings.extend(x / norm for x in vector)
+
+    sections = [("doc_ids", doc_ids), ("tfs", tfs), ("doc_lengths", doc_lengths), ("pages", pages),
+                ("text_offsets", text_offsets), ("embeddings", embeddings)]
+    meta = {
+        "pdf_sha256": pdf_sha256,
+        "n_docs": len(chunks),
+        "avgdl": sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0,
+        "dim": dim,
+        "vocab": vocab,
+    }
+    header = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        # Заголовок фиксированной длины с резервом под таблицу секций, заполняется в конце
+        f.write(_HEADER.pack(_MAGIC, len(header)))
+        f.write(header)
+        table_offset = _pad(f)
+        f.write(b"\0" * (16 * (len(sections) + 1)))
+        layout = []
+        for _, data in sections:
+            layout.append((_pad(f), len(data)))
+            data.tofile(f)
+        layout.append((_pad(f), len(texts)))
+        for blob in texts:
+            f.write(blob)
+        f.seek(table_offset)
+        for offset, count in layout:
+            f.write(struct.pack("<QQ", offset, count))
+    os.replace(tmp_path, path)
+
+class PdfIndex:
+    """
+    Read-only BM25 index over PDF chunks, memory-mapped from a file written by write_index.
+    Postings, lengths and texts stay in the page cache; only the vocabulary is loaded into memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"Not a PDF index file: {path}")
+        meta = json.loads(self._mm[_HEADER.size:_HEADER.size + header_len])
+        self.pdf_sha256 = meta["pdf_sha256"]
+        self.n_docs = meta["n_docs"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.dim = meta["dim"]
+        self._vocab = meta["vocab"]
+        table_offset = _HEADER.size + header_len + (-(_HEADER.size + header_len) % 8)
+        view = memoryview(self._mm)
+        names = (("doc_ids", "I"), ("tfs", "H"), ("doc_lengths", "I"), ("pages", "H"), ("text_offsets", "Q"), ("embeddings", "f"))
+        for i, (name, code) in enumerate(names):
+            offset, count = struct.unpack_from("<QQ", self._mm, table_offset + 16 * i)
+            size = array(code).itemsize
+            setattr(self, f"_{name}", view[offset:offset + count * size].cast(code))
+        self._texts_offset, _ = struct.unpack_from("<QQ", self._mm, table_offset + 16 * len(names))
+
+    def __len__(self):
+        return self.n_docs
+
+    def chunk(self, doc_id: int) -> tuple:
+        start, end = self._text_offsets[doc_id], self._text_offsets[doc_id + 1]
+        text = self._mm[self._texts_offset + start:self._texts_offset + end].decode("utf-8")
+        return self._pages[doc_id], text
+
+    def search(self, query: str, k: int = PDF_INDEX_TOP_K, query_vector=None, alpha: float = 0.5) -> list:
+        """
+        Top-k chunks for the query as [(score, page, text)].
+        With query_vector (and embeddings in the index) the score mixes normalized BM25 and cosine similarity.
+        """
+        scores = {}
+        for term in set(tokenize(query)):
+            entry = self._vocab.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            for i in range(start, start + df):
+                doc_id, tf = self._doc_ids[i], self._tfs[i]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        if query_vector is not None and self.dim:
+            norm = math.sqrt(sum(x * x for x in query_vector)) or 1.0
+            query_vector = [x / norm for x in query_vector]
+            top = max(scores.values(), default=0.0) or 1.0
+            emb, dim = self._embeddings, self.dim
+            scores = {
+                doc_id: (1 - alpha) * scores.get(doc_id, 0.0) / top
+                + alpha * sum(q * emb[doc_id * dim + j] for j, q in enumerate(query_vector))
+                for doc_id in range(self.n_docs)
+            }
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, *self.chunk(doc_id)) for doc_id, score in best if score > 0]
+
+    def close(self):
+        for name in ("_doc_ids", "_tfs", "_doc_lengths", "_pages", "_text_offsets", "_embeddings"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+def openai_batch_embedder(model: str):
+    from openai import OpenAI
+    client = OpenAI()
+
+    def embed_many(texts: list) -> list:
+        response = client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
+    return embed_many
+
+def build_pdf_index(pdf_path: str, index_path: str = PDF_INDEX_PATH, embed_many=None) -> None:
+    chunks = chunk_pages(extract_pages(pdf_path))
+    vectors = embed_many([text for _, text in chunks]) if embed_many and chunks else None
+    write_index(index_path, chunks, file_sha256(pdf_path), vectors)
+
+def load_or_build_pdf_index(pdf_path: str, index_path: str = PDF_INDEX_PATH, embed_many=None) -> PdfIndex:
+    """
+    Open the index for pdf_path, rebuilding it once if it is missing or was built from another version of the PDF.
+    """
+    pdf_sha256 = file_sha256(pdf_path)
+    index = _open_current(index_path, pdf_sha256, embed_many)
+    if index is not None:
+        return index
+    # Индекс строит один процесс; остальные воркеры ждут и открывают готовый файл (mmap, общие страницы)
+    with file_lock(index_path):
+        index = _open_current(index_path, pdf_sha256, embed_many)
+        if index is None:
+            build_pdf_index(pdf_path, index_path, embed_many)
+            index = PdfIndex(index_path)
+    return index
+
+def _open_current(index_path, pdf_sha256, embed_many):
+    if not os.path.exists(index_path):
+        return None
+    index = PdfIndex(index_path)
+    if index.pdf_sha256 == pdf_sha256 and (embed_many is None or index.dim):
+        return index
+    index.close()
+    return None
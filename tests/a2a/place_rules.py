@@ -0,0 +1,156 @@
+import os
+import re
+from intent import INTENT_KEYWORDS_DIR, compile_terms, load_keyword_files, normalize
+
+# Быстрый разбор шаблонных map-запросов ("кафе рядом с X", "cafes near X within 500m") без вызова Gemini
+PLACE_RULES_DIR = os.getenv("PLACE_RULES_DIR", os.path.join(INTENT_KEYWORDS_DIR, "places"))
+MAP_DEFAULT_RADIUS = int(os.getenv("MAP_DEFAULT_RADIUS", "1000"))
+# Город дописывается к локации без запятой: "Satpaev University" -> "Satpaev University, Almaty"
+MAP_DEFAULT_CITY = os.getenv("MAP_DEFAULT_CITY", "Almaty")
+MAP_DEFAULT_CITY_ALIASES = os.getenv("MAP_DEFAULT_CITY_ALIASES", "Алматы,Алма-Ата")
+PLACE_RULES_MAX_PLACE_WORDS = 5
+PLACE_RULES_MAX_LOCATION_WORDS = 8
+# Places API принимает радиус до 50 км
+MAX_RADIUS = 50000
+
+_NUM = r"(?P<value>\d+(?:[.,]\d+)?)"
+_UNIT = r"(?P<unit>км|километр\w*|шақырым|km|kilomet(?:er|re)s?|м|метр\w*|m|met(?:er|re)s?)(?!\w)"
+_RADIUS = [re.compile(p, re.IGNORECASE) for p in (
+    rf"\b(?:with)?in\s+(?:a\s+)?(?:radius\s+of\s+)?{_NUM}\s*{_UNIT}",
+    rf"\b{_NUM}\s*{_UNIT}\s+radius\b",
+    rf"(?:в\s+радиусе|в\s+пределах|не\s+дальше|не\s+далее)\s+{_NUM}\s*{_UNIT}",
+    rf"{_NUM}\s*{_UNIT}\s+(?:радиуста|радиусында|ішінде|аралығында|қашықтықта)",
+)]
+
+# Вопросительные слова — это уже не шаблонный запрос, пусть разбирает LLM
+_QUESTION = re.compile(r"(?<!\w)(?:how|why|what|when|which|как|почему|зачем|когда|сколько|какой|какие|қалай|неге|қашан|қандай)(?!\w)", re.IGNORECASE)
+_LEAD = re.compile(
+    r"^(?:(?:please|pls|find|show(?:\s+me)?|search(?:\s+for)?|look(?:ing)?\s+for|where\s+(?:is|are|can\s+i\s+find)|"
+    r"i\s+(?:need|want)|any|найди(?:те)?|покажи(?:те)?|подскажи(?:те)?|ищу|где(?:\s+(?:находится|находятся|есть))?|"
+    r"нужн[аоы]?|хочу\s+найти|пожалуйста|қайда)\s+)+",
+    re.IGNORECASE,
+)
+_TRAIL = re.compile(r"\s+(?:табыңыз|тауып\s+беріңіз|тап|көрсетіңіз|көрсет|please|пожалуйста)$", re.IGNORECASE)
+# Слова ранжирования не являются типом места: "best cafes" ищем как "cafes"
+_QUALIFIERS = re.compile(
+    r"^(?:(?:the\s+)?(?:best|top(?:\s*\d+)?|good|nearest|closest|лучш\w*|хорош\w*|ближайш\w*|топ(?:\s*\d+)?|ең\s+жақсы|жақсы|ең\s+жақын)\s+)+",
+    re.IGNORECASE,
+)
+# "<место> рядом с <локация>" — русский, английский и казахский с "жақын"
+_PREFIX = re.compile(
+    r"^(?P<place>.+?)\s+(?P<preposition>close\s+to|next\s+to|not\s+far\s+from|in\s+the\s+area\s+of|near(?:by)?|around|by|at|in|"
+    r"рядом\s+со?|недалеко\s+от|неподалеку\s+от|поблизости\s+от|вблизи|около|возле|в\s+районе|напротив|у|на|во?|"
+    r"жақын|жанында|қасында|маңында)\s+(?P<location>.+)$",
+    re.IGNORECASE,
+)
+# Голые предлоги ничего не говорят о локации ("кафе на карте", "cafe in 5 minutes"):
+# после них принимаем только имя собственное с заглавной буквы ("кафе на Абая", "cafes in Almaty")
+_BARE_PREPOSITIONS = {"in", "at", "by", "на", "в", "во", "у"}
+# Слова, которых не бывает в адресе: карта, время и пожелания к месту — такой запрос разбирает LLM
+_NOT_LOCATION = re.compile(
+    r"(?<!\w)(?:maps?|карт\w*|2gis|2гис|"
+    r"minutes?|mins?|hours?|walk\w*|drive|driving|today|tonight|now|open|минут\w*|мин|час\w*|пешком|ехать|сегодня|сейчас|"
+    r"завтра|открыт\w*|работа\w*|круглосуточн\w*|сағат\w*|бүгін|қазір|ашық|"
+    r"with|without|reviews?|ratings?|rated|cheap\w*|best|good|price\w*|отзыв\w*|рейтинг\w*|дешев\w*|недорог\w*|"
+    r"лучш\w*|хорош\w*|пікір\w*|арзан\w*|жақсы)(?!\w)",
+    re.IGNORECASE,
+)
+# Места относительно самого пользователя ("near me", "рядом со мной", "возле дома"): геокодер их не знает,
+# нужны координаты пользователя — такой запрос тоже разбирает LLM
+_USER_LOCATION = re.compile(
+    r"(?<!\w)(?:me|my|mine|myself|us|our|here|home|current|"
+    r"я|меня|мне|мной|мой|моя|мое|моё|моего|моей|моему|мою|моим|моих|нас|нам|нами|наш\w*|здесь|тут|сюда|отсюда|"
+    r"дом|дома|дому|домом|менің|маған|мұнда|осында)(?!\w)",
+    re.IGNORECASE,
+)
+# "<локация> маңындағы <место>" — казахский порядок слов
+_POSTFIX = re.compile(
+    r"^(?P<location>.+?)\s+(?:маңындағы|маңайындағы|жанындағы|қасындағы|төңірегіндегі|іргесіндегі|жақын\s+жердегі)\s+(?P<place>.+)$",
+    re.IGNORECASE,
+)
+_GENITIVE = re.compile(r"(?<=\w{3})(?:ның|нің|дың|дің|тың|тің)$", re.IGNORECASE)
+
+def _parse_radius(match) -> int:
+    value = float(match["value"].replace(",", "."))
+    if match["unit"].lower()[0] in "кkш":
+        value *= 1000
+    return max(1, min(MAX_RADIUS, int(value)))
+
+class PlaceRuleExtractor:
+    """
+    Grammar-based extractor of (place_type, location, radius) for formulaic map queries in Russian, Kazakh and English.
+    Returns None when the query does not fit a known pattern or the place type is not in the dictionary,
+    so the caller can fall back to the LLM extractor.
+    """
+
+    def __init__(self, place_terms, default_radius=MAP_DEFAULT_RADIUS, default_city=MAP_DEFAULT_CITY,
+                 city_aliases=MAP_DEFAULT_CITY_ALIASES):
+        self.default_radius = default_radius
+        self.default_city = default_city
+        self._city_names = [name.strip().lower() for name in [default_city, *city_aliases.split(",")] if name.strip()]
+        self._places = compile_terms(place_terms)
+        self.stats = {"hits": 0, "no_match": 0, "low_confidence": 0}
+
+    @classmethod
+    def from_directory(cls, directory: str = PLACE_RULES_DIR, **kwargs):
+        return cls([term for terms in load_keyword_files(directory).values() for term in terms], **kwargs)
+
+    def extract(self, query: str):
+        result = self._extract(query)
+        if isinstance(result, tuple):
+            self.stats["hits"] += 1
+            return result
+        self.stats[result] += 1
+        return None
+
+    def is_place_type(self, phrase: str) -> bool:
+        """
+        True when the whole phrase (ranking words aside) is a dictionary place type, e.g. "coffee shops", not "Chef".
+        """
+        return self._places.fullmatch(normalize(_QUALIFIERS.sub("", phrase.strip()))) is not None
+
+    def hit_ratio(self) -> float:
+        total = sum(self.stats.values())
+        return self.stats["hits"] / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "hit_ratio": self.hit_ratio()}
+
+    def _extract(self, query: str):
+        text = " ".join(query.split()).rstrip(" ?!.")
+        if not text or _QUESTION.search(text):
+            return "no_match"
+
+        radius = self.default_radius
+        for pattern in _RADIUS:
+            match = pattern.search(text)
+            if match:
+                radius = _parse_radius(match)
+                text = " ".join((text[:match.start()] + " " + text[match.end():]).split()).strip(" ,")
+                break
+        text = _TRAIL.sub("", _LEAD.sub("", text))
+
+        match = _POSTFIX.match(text)
+        postfix = match is not None
+        match = match or _PREFIX.match(text)
+        if match is None:
+            return "no_match"
+        place = _QUALIFIERS.sub("", match["place"]).strip(" ,")
+        location = match["location"].strip(" ,")
+        if postfix:
+            location = _GENITIVE.sub("", location)
+
+        if not place or len(place.split()) > PLACE_RULES_MAX_PLACE_WORDS:
+            return "low_confidence"
+        if not location or len(location.split()) > PLACE_RULES_MAX_LOCATION_WORDS or not re.search(r"[^\W\d_]", location):
+            return "low_confidence"
+        if _NOT_LOCATION.search(location) or _USER_LOCATION.search(location):
+            return "low_confidence"
+        if not postfix and match["preposition"].lower() in _BARE_PREPOSITIONS and not location[0].isupper():
+            return "low_confidence"
+        if not self._places.search(place.lower().replace("ё", "е")):
+            return "low_confidence"
+
+        if self.default_city and "," not in location and not any(name in location.lower() for name in self._city_names):
+            location = f"{location}, {self.default_city}"
+        return place, location, radius
@@ -0,0 +1,28 @@
+from itertools import islice
+
+class Place:
+    """
+    One Nearby Search result reduced to the fields the map pipeline uses. A raw result with geometry,
+    photos, plus_code and icons takes kilobytes once parsed; a record is a few hundred bytes.
+    """
+    __slots__ = ("place_id", "name", "rating", "vicinity", "lat", "lng")
+
+    def __init__(self, place_id: str, name: str, rating: float | None, vicinity: str | None, lat: float, lng: float):
+        self.place_id = place_id
+        self.name = name
+        self.rating = rating
+        self.vicinity = vicinity
+        self.lat, self.lng = lat, lng
+
+    @classmethod
+    def from_result(cls, result: dict) -> "Place":
+        location = result["geometry"]["location"]
+        return cls(result.get("place_id"), result.get("name"), result.get("rating"), result.get("vicinity"),
+                   location["lat"], location["lng"])
+
+    def __repr__(self) -> str:
+        return f"Place({self.name!r}, rating={self.rating}, vicinity={self.vicinity!r}, place_id={self.place_id!r})"
+
+def parse_places(results, limit: int | None = None) -> list:
+    # Проецируем результаты по порядку и останавливаемся на limit: остальные словари сразу уходят в мусор
+    return [Place.from_result(result) for result in islice(results, limit)]
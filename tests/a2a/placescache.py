@@ -0,0 +1,110 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from geocache import normalize_address
+from resilience import detach, within
+
+# Настройки кэша ответов Nearby Search
+PLACES_CACHE_TTL = float(os.getenv("PLACES_CACHE_TTL", str(6 * 3600)))
+PLACES_CACHE_SIZE = int(os.getenv("PLACES_CACHE_SIZE", "20000"))
+# Точка запроса приходит из кэша геокодинга, поэтому одна и та же локация даёт те же координаты;
+# округление лишь убирает шум последних знаков (1e-6 градуса — около 10 см)
+PLACES_CACHE_COORD_DIGITS = 6
+
+# Nearby Search отдаёт не больше 20 мест на страницу
+PLACES_PAGE_SIZE = 20
+
+class PlacesCache:
+    """
+    In-process LRU of whole Nearby Search answers keyed by (point, normalized keyword, radius) with a TTL.
+    A hit is the page the same direct search returned, in the same prominence order, so cached and uncached
+    answers never differ. Concurrent requests for the same search share one fetch, which runs outside any
+    one request's deadline.
+    """
+
+    def __init__(self, ttl=PLACES_CACHE_TTL, max_size=PLACES_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (lat, lng, keyword, radius) -> (places, expires_at)
+        self._inflight = {}  # (lat, lng, keyword, radius) -> Task
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0, "coalesced": 0, "evictions": 0}
+
+    async def search(self, lat, lng, keyword, radius, fetch, limit=PLACES_PAGE_SIZE):
+        """
+        Up to `limit` places matching keyword within radius meters of (lat, lng), ordered as Nearby Search
+        ranks them. fetch(lat, lng, keyword, radius) -> list of Place is the uncached call and must return
+        the whole page (up to 20 places), so one entry serves every limit.
+        """
+        key = (round(lat, PLACES_CACHE_COORD_DIGITS), round(lng, PLACES_CACHE_COORD_DIGITS), normalize_address(keyword), int(radius))
+        places = self._get(key)
+        if places is not None:
+            self.stats["hits"] += 1
+            return places[:limit]
+        self.stats["misses"] += 1
+        while True:
+            task = self._inflight.get(key)
+            if task is None:
+                # Загрузка — отдельная задача без срока запроса, который её начал: его отмена или
+                # истёкший срок не достаются остальным, каждый ждёт её в пределах своего срока
+                task = detach(self._load(lat, lng, keyword, radius, key, fetch))
+                task.add_done_callback(functools.partial(self._loaded, key))
+                self._inflight[key] = task
+            else:
+                self.stats["coalesced"] += 1
+            try:
+                return (await within("places_search", asyncio.shield(task)))[:limit]
+            except asyncio.CancelledError:
+                # Отменили саму загрузку, а не этот запрос — запускаем её заново
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {**self.stats, "size": size, "hit_ratio": self.hit_ratio()}
+
+    def hit_ratio(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            places, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return places
+
+    def _put(self, key, places):
+        with self._lock:
+            self._entries[key] = (places, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    async def _load(self, lat, lng, keyword, radius, key, fetch):
+        self.stats["fetches"] += 1
+        places = await fetch(lat, lng, keyword, radius)
+        self._put(key, places)
+        return places
+
+    def _loaded(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Ошибку получают только ожидающие этот поиск запросы; без них asyncio не пишет её в лог
+            task.exception()
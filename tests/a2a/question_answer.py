@@ -1,21 +1,38 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+import hashlib
+import json
+import time
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIResponsesModel, OpenAIResponsesModelSettings
-from openai import OpenAI
-from openai.types.responses import FileSearchToolParam
+from pydantic_core import from_json
 from dotenv import load_dotenv
 import os
+from serving import file_lock
+
+# pydantic_ai и openai импортируются при сборке агента, а не при импорте модуля: сервер поднимается без них
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ToolCallPart
 
 load_dotenv()
 
+# Манифест: sha256 PDF -> уже загруженные vector store и файл
+VECTOR_STORE_MANIFEST = os.getenv('VECTOR_STORE_MANIFEST', 'data/vector_store_manifest.json')
+# Запись, проверенная в OpenAI не раньше чем столько секунд назад, используется без повторной проверки
+# (проверяет первый прогревшийся воркер, остальные берут его запись без сетевых запросов)
+VECTOR_STORE_VERIFY_TTL = float(os.getenv('VECTOR_STORE_VERIFY_TTL', '300'))
+
+# Поиск по PDF: "hosted" — file_search в OpenAI vector store, "local" — локальный BM25-индекс (pdf_index.py)
+QA_RETRIEVAL = os.getenv('QA_RETRIEVAL', 'hosted')
+
 # === Зависимости агента ===
 @dataclass
 class AppAgentDeps:
     vector_store_id: Optional[str] = None
     pdf_file_id: Optional[str] = None
     pdf_path: str = 'data/project_info.pdf'
+    pdf_sha256: Optional[str] = None
     openai_api_key: Optional[str] = os.getenv('OPENAI_API_KEY')
 
 # === Модель ответа ===
@@ -23,22 +40,109 @@ class AppAgentOutput(BaseModel):
     answer: str = Field(..., description='Ответ на вопрос пользователя')
     source: str = Field(..., description='Источник ответа: "pdf" или "llm"')
 
+# === Манифест загруженных vector store ===
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(path: str = VECTOR_STORE_MANIFEST) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest: dict, path: str = VECTOR_STORE_MANIFEST) -> None:
+    # Пишем во временный файл и атомарно подменяем, чтобы параллельные процессы не прочитали половину
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def openai_client(api_key: Optional[str] = None) -> 'OpenAI':
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+def verify_vector_store(client: 'OpenAI', vector_store_id: str, file_id: str) -> bool:
+    from openai import NotFoundError
+    try:
+        vector_store = client.vector_stores.retrieve(vector_store_id)
+        if vector_store.status == 'expired':
+            return False
+        store_file = client.vector_stores.files.retrieve(file_id, vector_store_id=vector_store_id)
+        return store_file.status in ('completed', 'in_progress')
+    except NotFoundError:
+        return False
+
+def _delete_vector_store(client: 'OpenAI', entry: dict) -> None:
+    # Старые store/файл удаляем по возможности, ошибки не критичны
+    for delete, object_id in ((client.vector_stores.delete, entry.get('vector_store_id')),
+                              (client.files.delete, entry.get('pdf_file_id'))):
+        if object_id:
+            try:
+                delete(object_id)
+            except Exception:
+                pass
+
 # === Вспомогательная функция для загрузки PDF в vector store ===
-def setup_vector_store(deps: AppAgentDeps) -> AppAgentDeps:
-    client = OpenAI(api_key=deps.openai_api_key)
-    # Создаём vector store (однократно)
+def setup_vector_store(deps: AppAgentDeps, client: Optional['OpenAI'] = None,
+                       manifest_path: str = VECTOR_STORE_MANIFEST) -> AppAgentDeps:
+    deps.pdf_sha256 = file_sha256(deps.pdf_path)
+    # Недавно проверенная запись (например, другим воркером) — без обращения к OpenAI
+    entry = load_manifest(manifest_path).get(deps.pdf_sha256)
+    if _recently_verified(entry):
+        return _use_entry(deps, entry)
+    # Проверяет и загружает только один процесс; остальные ждут и берут его запись из манифеста
+    with file_lock(manifest_path):
+        return _setup_vector_store_locked(deps, client or openai_client(deps.openai_api_key), manifest_path)
+
+def _recently_verified(entry: Optional[dict]) -> bool:
+    return bool(entry) and time.time() - entry.get('verified_at', 0) < VECTOR_STORE_VERIFY_TTL
+
+def _use_entry(deps: AppAgentDeps, entry: dict) -> AppAgentDeps:
+    deps.vector_store_id = entry['vector_store_id']
+    deps.pdf_file_id = entry['pdf_file_id']
+    return deps
+
+def _setup_vector_store_locked(deps: AppAgentDeps, client: 'OpenAI', manifest_path: str) -> AppAgentDeps:
+    manifest = load_manifest(manifest_path)
+    entry = manifest.get(deps.pdf_sha256)
+    if _recently_verified(entry):
+        return _use_entry(deps, entry)
+    # PDF не менялся и store на месте — переиспользуем без загрузки
+    if entry and verify_vector_store(client, entry['vector_store_id'], entry['pdf_file_id']):
+        save_manifest({**manifest, deps.pdf_sha256: {**entry, 'verified_at': time.time()}}, manifest_path)
+        return _use_entry(deps, entry)
+    # Создаём vector store
     vector_store = client.vector_stores.create(name="project_info_store")
-    # Загружаем PDF (однократно)
-    file_response = client.files.create(file=open(deps.pdf_path, 'rb'), purpose="assistants")
+    # Загружаем PDF
+    with open(deps.pdf_path, 'rb') as f:
+        file_response = client.files.create(file=f, purpose="assistants")
     client.vector_stores.files.create(vector_store_id=vector_store.id, file_id=file_response.id)
     deps.vector_store_id = vector_store.id
     deps.pdf_file_id = file_response.id
+    for stale in manifest.values():
+        _delete_vector_store(client, stale)
+    save_manifest({
+        deps.pdf_sha256: {
+            'vector_store_id': deps.vector_store_id,
+            'pdf_file_id': deps.pdf_file_id,
+            'pdf_path': deps.pdf_path,
+            'created_at': time.time(),
+            'verified_at': time.time(),
+        }
+    }, manifest_path)
     return deps
 
-
-
 # === Агент с Responses API и file_search tool ===
-def build_agent(vector_store_id: str) -> Agent:
+def build_agent(vector_store_id: str) -> 'Agent':
+    from openai.types.responses import FileSearchToolParam
+    from pydantic_ai import Agent
+    from pydantic_ai.models.openai import OpenAIResponsesModel, OpenAIResponsesModelSettings
     # Включаем file_search tool для Responses API
     model_settings = OpenAIResponsesModelSettings(
         openai_builtin_tools=[FileSearchToolParam(type='file_search', vector_store_ids=[vector_store_id])]
@@ -55,11 +159,87 @@ def build_agent(vector_store_id: str) -> Agent:
     )
     return agent
 
+# === Агент с локальным поиском по PDF ===
+def build_local_agent(index, top_k: Optional[int] = None, embed=None) -> 'Agent':
+    """
+    Agent without hosted tools: the top-k PDF chunks for each question are retrieved from the local index
+    and injected into the system prompt. embed (async text -> vector) enables hybrid search if the index has embeddings.
+    """
+    from pdf_index import PDF_INDEX_TOP_K
+    from pydantic_ai import Agent, RunContext
+    from pydantic_ai.models.openai import OpenAIResponsesModel
+    top_k = top_k or PDF_INDEX_TOP_K
+    agent = Agent(
+        model=OpenAIResponsesModel('gpt-4o'),
+        output_type=AppAgentOutput,
+        system_prompt=(
+            'Ты — интеллектуальный агент. Если вопрос о приложении, отвечай по фрагментам PDF ниже и укажи источник "pdf". '
+            'Если нет — отвечай как обычный LLM. Всегда указывай источник ответа: "pdf" или "llm".'
+        ),
+    )
+
+    @agent.system_prompt(dynamic=True)
+    async def pdf_context(ctx: RunContext) -> str:
+        query = ctx.prompt if isinstance(ctx.prompt, str) else ''
+        query_vector = await embed(query) if embed and index.dim else None
+        hits = index.search(query, top_k, query_vector=query_vector)
+        if not hits:
+            return 'Во фрагментах PDF нет ничего по этому вопросу.'
+        return 'Фрагменты PDF:\n\n' + '\n\n'.join(f'[стр. {page}] {text}' for _, page, text in hits)
+
+    return agent
+
+def setup_agent(deps: AppAgentDeps) -> 'Agent':
+    # Один вход для сервера и CLI: режим поиска выбирается QA_RETRIEVAL
+    if QA_RETRIEVAL == 'local':
+        from pdf_index import load_or_build_pdf_index, openai_batch_embedder, PDF_INDEX_EMBEDDING_MODEL
+        embed_many = openai_batch_embedder(PDF_INDEX_EMBEDDING_MODEL) if PDF_INDEX_EMBEDDING_MODEL else None
+        index = load_or_build_pdf_index(deps.pdf_path, embed_many=embed_many)
+        deps.pdf_sha256 = index.pdf_sha256
+        embed = None
+        if PDF_INDEX_EMBEDDING_MODEL:
+            from answer_cache import openai_embedder
+            embed = openai_embedder(PDF_INDEX_EMBEDDING_MODEL)
+        return build_local_agent(index, embed=embed)
+    deps = setup_vector_store(deps)
+    return build_agent(deps.vector_store_id)
+
+# === Потоковый ответ ===
+def _partial_answer(part: 'ToolCallPart') -> Optional[str]:
+    # Аргументы вызова output tool приходят кусками JSON: {"answer": "Onaitabu — это
+    if not isinstance(part.args, str):
+        return (part.args or {}).get('answer')
+    try:
+        partial = from_json(part.args or '{}', allow_partial='trailing-strings')
+    except ValueError:
+        return None
+    return partial.get('answer') if isinstance(partial, dict) else None
+
+async def stream_answer(agent: 'Agent', query: str):
+    """
+    Stream the agent's answer as text deltas while the model is still generating.
+    Yields (delta, None) pairs and finally ('', AppAgentOutput) with the validated output.
+    """
+    from pydantic_ai.messages import ToolCallPart
+    async with agent.run_stream(query) as result:
+        sent = 0
+        async for response, _ in result.stream_structured(debounce_by=None):
+            for part in response.parts:
+                if not isinstance(part, ToolCallPart):
+                    continue
+                answer = _partial_answer(part)
+                if isinstance(answer, str) and len(answer) > sent:
+                    yield answer[sent:], None
+                    sent = len(answer)
+        output = await result.get_output()
+    if len(output.answer) > sent:
+        yield output.answer[sent:], None
+    yield '', output
+
 # === Пример main ===
 def main():
     deps = AppAgentDeps()
-    deps = setup_vector_store(deps)
-    agent = build_agent(deps.vector_store_id)
+    agent = setup_agent(deps)
     while True:
         query = input("Введите ваш вопрос: ")
         # Для Responses API: file_search tool будет вызван автоматически, если вопрос о приложении
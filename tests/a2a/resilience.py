@@ -0,0 +1,231 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from metrics import REGISTRY, Counter
+
+# Бюджет времени на весь запрос: задаётся роутером и передаётся дальше как оставшиеся миллисекунды
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))
+# Запас на ответ и сеть: backend заканчивает работу чуть раньше, чем вызывающий перестанет ждать
+DEADLINE_MARGIN = float(os.getenv("DEADLINE_MARGIN", "0.05"))
+# Circuit breaker: открывается после BREAKER_FAILURES ошибок подряд, пробный вызов — через BREAKER_RESET секунд
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "10"))
+# Вызов, получивший столько секунд и не успевший ответить, считается сбоем upstream, даже если его оборвал срок запроса
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "1.0"))
+
+# JSON-RPC коды отказов: истёк срок запроса и upstream недоступен (breaker открыт); -32029 — перегрузка (admission)
+DEADLINE_EXCEEDED_ERROR_CODE = -32030
+UNAVAILABLE_ERROR_CODE = -32031
+
+# Момент (time.monotonic()), к которому текущий запрос должен быть обработан
+deadline_var = contextvars.ContextVar("deadline", default=None)
+
+SHED = Counter("onaitabu_shed_requests_total", "Upstream calls refused before being made", ("upstream", "reason"))
+DEADLINE_TIMEOUTS = Counter("onaitabu_deadline_timeouts_total", "Upstream calls cut short by the request deadline", ("upstream",))
+
+class DeadlineExceeded(Exception):
+    def __init__(self, message: str, timeout=None):
+        super().__init__(message)
+        # Сколько времени было у оборванного вызова; None — вызов не начинался
+        self.timeout = timeout
+
+class CircuitOpen(Exception):
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable, retry in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+@contextmanager
+def deadline(seconds):
+    """
+    Run the block with a deadline `seconds` from now; an enclosing deadline that is sooner still wins.
+    """
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = deadline_var.get()
+    token = deadline_var.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+def remaining():
+    at = deadline_var.get()
+    return None if at is None else at - time.monotonic()
+
+def budget(upstream: str, default=None):
+    """
+    Timeout for the next call to upstream: the client default capped by what is left of the request deadline.
+    Raises DeadlineExceeded (and counts the call as shed) when nothing is left.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        SHED.inc(upstream, "deadline")
+        raise DeadlineExceeded(f"Deadline exceeded before calling {upstream}")
+    return left if default is None else min(default, left)
+
+def deadline_ms():
+    # Оставшийся бюджет для передачи следующему агенту (metadata / X-Deadline-Ms)
+    left = remaining()
+    return None if left is None else max(0, int(left * 1000))
+
+def deadline_from(params, context=None):
+    # Как trace_id: сначала metadata сообщения, затем заголовок; None, если вызывающий срок не передал
+    metadata = params.message.metadata or {}
+    value = metadata.get("deadline_ms")
+    if value is None:
+        headers = getattr(context, "state", {}).get("headers", {}) if context is not None else {}
+        value = headers.get("x-deadline-ms")
+    try:
+        return max(0.0, float(value) / 1000 - DEADLINE_MARGIN) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+async def within(upstream: str, awaitable, default=None):
+    """
+    Await under the request deadline (and the default timeout); timing out raises DeadlineExceeded
+    when the deadline was the binding limit, asyncio.TimeoutError otherwise.
+    """
+    try:
+        timeout = budget(upstream, default)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if cut_by_deadline(upstream, timeout, default):
+            raise DeadlineExceeded(f"Deadline exceeded while waiting for {upstream}", timeout) from None
+        raise
+
+def cut_by_deadline(upstream: str, timeout, default) -> bool:
+    # Таймаут вызова с урезанным бюджетом означает исчерпанный срок запроса, а не сбой upstream
+    if default is not None and timeout >= default:
+        return False
+    DEADLINE_TIMEOUTS.inc(upstream)
+    return True
+
+def detach(coro) -> asyncio.Task:
+    """
+    Run coro as a task outside the caller's request deadline, for work shared by several requests
+    (coalesced fetches): it is bounded only by its own default timeouts, and each caller applies its
+    own deadline to its wait with within(..., asyncio.shield(task)).
+    """
+    context = contextvars.copy_context()
+    context.run(deadline_var.set, None)
+    return asyncio.get_running_loop().create_task(coro, context=context)
+
+def copy_deadline(fn):
+    # Потоки пула не наследуют contextvars — переносим срок запроса в вызов
+    at = deadline_var.get()
+
+    def run(*args):
+        token = deadline_var.set(at)
+        try:
+            return fn(*args)
+        finally:
+            deadline_var.reset(token)
+    return run
+
+_STATES = {"closed": 0, "half_open": 1, "open": 2}
+_breakers = []
+
+class CircuitBreaker:
+    """
+    Per-upstream breaker: after `failures` consecutive failures calls fail fast with CircuitOpen for
+    reset_timeout seconds, then a single trial call is let through; its success closes the breaker.
+    A call cut by the request deadline counts as a failure only if it had at least slow_call seconds.
+    """
+
+    def __init__(self, upstream: str, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET, slow_call=BREAKER_SLOW_CALL):
+        self.upstream = upstream
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0}
+        _breakers.append(self)
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open":
+                wait = self._opened_at + self.reset_timeout - time.monotonic()
+                if wait > 0:
+                    self._reject(wait)
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open":
+                if self._trial:
+                    self._reject(self.reset_timeout)
+                self._trial = True
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    @contextmanager
+    def guard(self):
+        self.allow()
+        try:
+            yield
+        except DeadlineExceeded as e:
+            if e.timeout is not None and e.timeout >= self.slow_call:
+                self.failure()
+            else:
+                self._release()
+            raise
+        except Exception:
+            self.failure()
+            raise
+        except BaseException:
+            # Отмена (проигравший hedge/fan-out) ничего не говорит о здоровье upstream
+            self._release()
+            raise
+        else:
+            self.success()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "state": self.state, "consecutive_failures": self._consecutive}
+
+    def _release(self):
+        with self._lock:
+            self._trial = False
+
+    def _reject(self, retry_after):
+        self.stats["rejected"] += 1
+        SHED.inc(self.upstream, "circuit_open")
+        raise CircuitOpen(self.upstream, retry_after)
+
+def _collect_breakers():
+    for breaker in _breakers:
+        labels = {"upstream": breaker.upstream}
+        yield "onaitabu_circuit_state", labels, _STATES[breaker.state]
+        yield "onaitabu_circuit_opened_total", labels, breaker.stats["opened"]
+
+REGISTRY.add_collector(_collect_breakers)
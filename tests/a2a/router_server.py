@@ -1,39 +1,140 @@
 import os
-import requests
+import json
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+import httpx
 from a2a.types import AgentCard, AgentSkill, AgentCapabilities, Message, MessageSendParams, Task, Role, Part, TextPart
 from a2a.server.request_handlers.request_handler import RequestHandler
 from a2a.server.apps import A2AStarletteApplication
-import uvicorn
+from intent import IntentClassifier
+from hedge import LatencyTracker, hedged
+from metrics import REGISTRY, Counter, metrics_route, span, in_flight, trace, trace_id_var, trace_id_from, record_upstream
+from serving import Readiness, serve
+from batch import JsonRpcBatch
+from resilience import (
+    REQUEST_DEADLINE, CircuitBreaker, CircuitOpen, DeadlineExceeded, budget, cut_by_deadline, deadline, deadline_from, deadline_ms,
+)
 
 # Адреса backend-агентов
 ANSWER_QUESTION_URL = os.getenv("ANSWER_QUESTION_URL", "http://localhost:8001")
 MAP_URL = os.getenv("MAP_URL", "http://localhost:8002")
+# Дополнительные реплики через запятую; запросы распределяются по кругу, хеджированные дубли уходят на следующую
+ANSWER_QUESTION_REPLICA_URLS = os.getenv("ANSWER_QUESTION_REPLICA_URLS", "")
+MAP_REPLICA_URLS = os.getenv("MAP_REPLICA_URLS", "")
+
+# Неуверенно классифицированные запросы отправляются сразу в оба backend-а, побеждает лучший ответ
+ROUTER_FANOUT = os.getenv("ROUTER_FANOUT", "0") == "1"
+# Дубль запроса на реплику, если ответ не пришёл за перцентиль недавних задержек (HEDGE_PERCENTILE)
+ROUTER_HEDGE = os.getenv("ROUTER_HEDGE", "0") == "1"
+ROUTER_HEDGE_MAX_ATTEMPTS = int(os.getenv("ROUTER_HEDGE_MAX_ATTEMPTS", "2"))
+
+# Пул соединений к backend-агентам: размер и таймауты (в секундах)
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "100"))
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "60"))
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "5"))
+BACKEND_KEEPALIVE_EXPIRY = float(os.getenv("BACKEND_KEEPALIVE_EXPIRY", "30"))
 
-# Классификатор: map или qa
-MAP_KEYWORDS = ["карта", "place", "address", "где находится", "найти на карте", "location", "координаты"]
+# Классификатор: map или qa. Словари лежат в keywords/ (INTENT_KEYWORDS_DIR) и компилируются один раз при старте
+intent_classifier = IntentClassifier.from_directory()
 def classify_query(query: str) -> str:
-    if any(k in query.lower() for k in MAP_KEYWORDS):
-        return "map"
-    return "qa"
+    return intent_classifier.classify(query)
+
+def _split_urls(value: str) -> list:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+BACKENDS = {
+    "map": [MAP_URL, *_split_urls(MAP_REPLICA_URLS)],
+    "qa": [ANSWER_QUESTION_URL, *_split_urls(ANSWER_QUESTION_REPLICA_URLS)],
+}
+_backend_names = {url: name for name, urls in BACKENDS.items() for url in urls}
+# Свой circuit breaker на каждый адрес: при хеджировании отказ одной реплики не мешает остальным
+_breakers = {url: CircuitBreaker(name if i == 0 else f"{name}_{i}") for name, urls in BACKENDS.items() for i, url in enumerate(urls)}
+_next_replica = dict.fromkeys(BACKENDS, 0)
+latency = {name: LatencyTracker() for name in BACKENDS}
+
+ROUTES = Counter("onaitabu_router_routes_total", "Answered requests by routing mode and answering backend", ("mode", "backend"))
+HEDGES = Counter("onaitabu_router_hedges_total", "Hedged duplicate requests by backend and outcome", ("backend", "outcome"))
+
+# Один keep-alive клиент (HTTP/1.1) на каждый backend, переиспользуется между запросами
+_clients: dict[str, httpx.AsyncClient] = {}
+
+def get_client(url: str) -> httpx.AsyncClient:
+    client = _clients.get(url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=url,
+            http1=True,
+            http2=False,
+            limits=httpx.Limits(
+                max_connections=BACKEND_POOL_SIZE,
+                max_keepalive_connections=BACKEND_POOL_SIZE,
+                keepalive_expiry=BACKEND_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(BACKEND_TIMEOUT, connect=BACKEND_CONNECT_TIMEOUT),
+        )
+        _clients[url] = client
+    return client
+
+async def close_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
 
-def call_backend(url: str, query: str) -> str:
-    payload = {
+def _backend_name(url: str) -> str:
+    return _backend_names.get(url, url)
+
+def get_breaker(url: str) -> CircuitBreaker:
+    breaker = _breakers.get(url)
+    if breaker is None:
+        breaker = _breakers[url] = CircuitBreaker(_backend_name(url))
+    return breaker
+
+def _request_deadline(params, context=None) -> float:
+    # Срок от клиента соблюдаем, но не дольше собственного бюджета роутера
+    requested = deadline_from(params, context)
+    return REQUEST_DEADLINE if requested is None else min(requested, REQUEST_DEADLINE)
+
+def _trace_headers() -> dict:
+    headers = {}
+    trace_id = trace_id_var.get()
+    if trace_id:
+        headers["X-Trace-Id"] = trace_id
+    left = deadline_ms()
+    if left is not None:
+        headers["X-Deadline-Ms"] = str(left)
+    return headers
+
+def _backend_timeout(limit: float) -> httpx.Timeout:
+    return httpx.Timeout(limit, connect=min(limit, BACKEND_CONNECT_TIMEOUT))
+
+def build_payload(query: str, method: str = "message/send") -> dict:
+    metadata = {}
+    trace_id = trace_id_var.get()
+    if trace_id:
+        metadata["trace_id"] = trace_id
+    left = deadline_ms()
+    if left is not None:
+        metadata["deadline_ms"] = left
+    return {
         "jsonrpc": "2.0",
         "id": 1,
-        "method": "message/send",
+        "method": method,
         "params": {
             "message": {
                 "kind": "message",
                 "messageId": "1",
                 "role": "user",
-                "parts": [{"kind": "text", "text": query}]
+                "parts": [{"kind": "text", "text": query}],
+                "metadata": metadata or None
             },
             "configuration": {"acceptedOutputModes": ["text/plain"]}
         }
     }
-    resp = requests.post(url + "/", json=payload)
-    resp.raise_for_status()
-    data = resp.json()
+
+def parse_backend_response(data: dict) -> str:
     # Если ошибка — вернуть её как текст
     if "error" in data:
         return f"Ошибка backend-агента: {data['error'].get('message', str(data['error']))}"
@@ -52,14 +153,158 @@ def call_backend(url: str, query: str) -> str:
     except Exception as e:
         return f"Ошибка парсинга ответа backend-агента: {e}"
 
+async def call_backend(url: str, query: str, timeout: float | None = None) -> str:
+    client = get_client(url)
+    name = _backend_name(url)
+    default = BACKEND_TIMEOUT if timeout is None else timeout
+    try:
+        # Таймаут — не больше остатка срока запроса; открытый breaker отказывает без обращения к backend-у
+        limit = budget(name, default)
+        with get_breaker(url).guard():
+            try:
+                resp = await client.post("/", json=build_payload(query), headers=_trace_headers(), timeout=_backend_timeout(limit))
+            except httpx.TimeoutException:
+                record_upstream(name, "timeout")
+                if cut_by_deadline(name, limit, default):
+                    raise DeadlineExceeded(f"Deadline exceeded while waiting for {name}", limit) from None
+                raise
+            except httpx.HTTPError:
+                record_upstream(name, "error")
+                raise
+            record_upstream(name, "ok" if resp.is_success else "error")
+            resp.raise_for_status()
+    except (httpx.TimeoutException, DeadlineExceeded):
+        return f"Ошибка backend-агента: превышено время ожидания ответа от {url}"
+    except CircuitOpen as e:
+        return f"Ошибка backend-агента: {e}"
+    return parse_backend_response(resp.json())
+
+async def stream_backend(url: str, query: str, timeout: float | None = None):
+    # Проксируем SSE backend-агента: каждое событие отдаём сразу, без буферизации ответа
+    name = _backend_name(url)
+    default = BACKEND_TIMEOUT if timeout is None else timeout
+    try:
+        limit = budget(name, default)
+        with get_breaker(url).guard():
+            try:
+                async with get_client(url).stream(
+                    "POST",
+                    "/",
+                    json=build_payload(query, method="message/stream"),
+                    headers={"Accept": "text/event-stream", **_trace_headers()},
+                    timeout=_backend_timeout(limit),
+                ) as resp:
+                    record_upstream(name, "ok" if resp.is_success else "error")
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if line.startswith("data:"):
+                            yield parse_backend_response(json.loads(line[5:]))
+            except httpx.TimeoutException:
+                if cut_by_deadline(name, limit, default):
+                    raise DeadlineExceeded(f"Deadline exceeded while waiting for {name}", limit) from None
+                raise
+    except (httpx.TimeoutException, DeadlineExceeded):
+        record_upstream(name, "timeout")
+        yield f"Ошибка backend-агента: превышено время ожидания ответа от {url}"
+    except CircuitOpen as e:
+        yield f"Ошибка backend-агента: {e}"
+
+def _is_error(answer: str) -> bool:
+    return answer.startswith("Ошибка")
+
+def _replicas(target: str, count: int) -> list:
+    # По кругу начиная со следующей реплики; с одним адресом дубль уходит туда же (другому воркеру backend-а)
+    urls = BACKENDS[target]
+    start = _next_replica[target]
+    _next_replica[target] = (start + 1) % len(urls)
+    return [urls[(start + i) % len(urls)] for i in range(count)]
+
+async def _timed_call(target: str, url: str, query: str) -> str:
+    started = time.perf_counter()
+    try:
+        answer = await call_backend(url, query)
+    except asyncio.CancelledError:
+        # Отменённый запрос шёл как минимум столько; без этого замера порог хеджирования занижается
+        latency[target].observe(time.perf_counter() - started)
+        raise
+    if not _is_error(answer):
+        latency[target].observe(time.perf_counter() - started)
+    return answer
+
+async def ask_backend(target: str, query: str) -> str:
+    """
+    Answer from one backend. With ROUTER_HEDGE a duplicate goes to the next replica once the call outlives
+    the backend's recent latency percentile; the first successful answer wins.
+    """
+    if not ROUTER_HEDGE:
+        return await _timed_call(target, _replicas(target, 1)[0], query)
+    attempts = 0
+
+    async def attempt(url):
+        nonlocal attempts
+        attempts += 1
+        if attempts > 1:
+            HEDGES.inc(target, "issued")
+        return await _timed_call(target, url, query)
+
+    answer, winner = await hedged(attempt, _replicas(target, ROUTER_HEDGE_MAX_ATTEMPTS), latency[target].hedge_delay(),
+                                  accept=lambda answer: not _is_error(answer))
+    if winner:
+        HEDGES.inc(target, "won")
+    return answer
+
+def answer_strength(target: str, answer: str | None) -> int:
+    # 2 — ответ по существу (найдены места / ответ из PDF), 1 — общий ответ LLM, 0 — ошибка или запрос не понят
+    if answer is None or _is_error(answer):
+        return 0
+    if target == "map":
+        return 2 if "Top " in answer else 0
+    return 2 if answer.rstrip().endswith("(Источник: pdf)") else 1
+
+async def fan_out(query: str, preferred: str) -> tuple:
+    """
+    Send an ambiguous query to every backend at once. A substantive answer wins immediately and the other
+    calls are cancelled; otherwise the strongest answer is used, ties going to the classifier's pick.
+    """
+    tasks = {asyncio.ensure_future(ask_backend(target, query)): target for target in BACKENDS}
+    best = None
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                target = tasks[task]
+                answer = f"Ошибка backend-агента: {task.exception()}" if task.exception() else task.result()
+                strength = answer_strength(target, answer)
+                if strength == 2:
+                    return target, answer
+                candidate = (strength, target == preferred, target, answer)
+                if best is None or candidate[:2] > best[:2]:
+                    best = candidate
+        return best[2], best[3]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def route(query: str) -> str:
+    with span("router", "classify"):
+        target, confident = intent_classifier.classify_with_confidence(query)
+    if ROUTER_FANOUT and not confident:
+        with span("router", "fanout"):
+            target, answer = await fan_out(query, target)
+        ROUTES.inc("fanout", target)
+        return answer
+    with span("router", f"call_backend_{target}"):
+        answer = await ask_backend(target, query)
+    ROUTES.inc("single", target)
+    return answer
+
 class RouterHandler(RequestHandler):
     async def on_message_send(self, params: MessageSendParams, context=None):
         user_message = params.message.parts[0].root.text
-        target = classify_query(user_message)
-        if target == "map":
-            answer = call_backend(MAP_URL, user_message)
-        else:
-            answer = call_backend(ANSWER_QUESTION_URL, user_message)
+        with trace(trace_id_from(params, context)), deadline(_request_deadline(params, context)), in_flight("router"):
+            answer = await route(user_message)
         return Message(
             messageId="1",
             role=Role.agent,
@@ -71,7 +316,21 @@ class RouterHandler(RequestHandler):
     async def on_cancel_task(self, params, context=None):
         return None
     async def on_message_send_stream(self, params, context=None):
-        return
+        user_message = params.message.parts[0].root.text
+        with trace(trace_id_from(params, context)), deadline(_request_deadline(params, context)), in_flight("router"):
+            with span("router", "classify"):
+                target = classify_query(user_message)
+            # Стрим сразу отдаётся клиенту, поэтому здесь без fan-out и хеджирования
+            url = _replicas(target, 1)[0]
+            message_id = uuid.uuid4().hex
+            with span("router", f"stream_backend_{target}"):
+                async for chunk in stream_backend(url, user_message):
+                    yield Message(
+                        messageId=message_id,
+                        role=Role.agent,
+                        parts=[Part(root=TextPart(text=chunk))],
+                        kind="message"
+                    )
     async def on_set_task_push_notification_config(self, params, context=None):
         return None
     async def on_get_task_push_notification_config(self, params, context=None):
@@ -84,7 +343,7 @@ agent_card = AgentCard(
     description="Роутер для Q&A и Map агентов",
     version="1.0",
     url="http://localhost:8000",
-    capabilities=AgentCapabilities(),
+    capabilities=AgentCapabilities(streaming=True),
     defaultInputModes=["text/plain"],
     defaultOutputModes=["text/plain"],
     skills=[
@@ -97,8 +356,29 @@ agent_card = AgentCard(
     ]
 )
 
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_clients()
+
+readiness = Readiness("router")
 handler = RouterHandler()
-app = A2AStarletteApplication(agent_card=agent_card, http_handler=handler).build()
+# POST / с JSON-массивом — пакет message/send (ночные выгрузки): элементы идут в backend-ы параллельно,
+# не более BATCH_CONCURRENCY одновременно; одиночные запросы обрабатывает A2A-приложение как раньше
+app = JsonRpcBatch(
+    A2AStarletteApplication(agent_card=agent_card, http_handler=handler).build(
+        lifespan=readiness.lifespan(lifespan),
+        routes=[metrics_route, readiness.route],
+    ),
+    handler,
+)
+
+def _collect_batch_stats():
+    for key, value in app.snapshot().items():
+        yield f"onaitabu_router_batch_{key}", {}, value
+
+REGISTRY.add_collector(_collect_batch_stats)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # SERVER_WORKERS=auto — по воркеру на ядро
+    serve(app, "router_server:app", port=8000)
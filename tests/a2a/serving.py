@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка между процессами недоступна, работаем без неё
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Число процессов-воркеров на сервер: число или "auto" (по количеству ядер)
+SERVER_WORKERS = os.getenv("SERVER_WORKERS", "1")
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+# Сколько секунд воркеры дорабатывают начатые запросы при остановке
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# Прогрев (импорт SDK, сборка агентов) после старта: "background" — в потоке, порт уже принимает запросы,
+# "startup" — до начала приёма запросов, "off" — только при первом использовании
+SERVER_WARMUP = os.getenv("SERVER_WARMUP", "background")
+# Неудачный прогрев повторяется в фоне: первая пауза, затем вдвое больше, но не дольше максимума
+SERVER_WARMUP_RETRY = float(os.getenv("SERVER_WARMUP_RETRY", "5"))
+SERVER_WARMUP_RETRY_MAX = float(os.getenv("SERVER_WARMUP_RETRY_MAX", "300"))
+
+_UNSET = object()
+
+def worker_count(value=SERVER_WORKERS) -> int:
+    if str(value).strip().lower() == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive lock between processes (flock on path + ".lock"), so one-time work such as uploading the PDF
+    or building the index is done by one worker while the others wait and then reuse its result.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class Lazy:
+    """
+    Value built by build() on first use, once, from any thread: heavy SDK imports and agent construction
+    stay out of module import. aget() builds in a worker thread so the event loop keeps serving meanwhile.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not _UNSET
+
+    def get(self):
+        if self._value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    self._value = self._build()
+        return self._value
+
+    async def aget(self):
+        if self._value is not _UNSET:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def set(self, value):
+        # Готовое значение вместо сборки (заглушки в бенчмарках и нагрузочном тесте)
+        self._value = value
+
+class Readiness:
+    """
+    Per-worker readiness for /ready: 503 until startup has finished and again once shutdown begins,
+    so a load balancer only sends traffic to workers that can serve it. Checks (name -> callable)
+    can take a worker out of rotation while it is saturated. warmup_checks test what warmup() builds and
+    are skipped with SERVER_WARMUP=off, where it is built by the first request instead. warmup() runs
+    once per worker as SERVER_WARMUP says and is retried in the background with backoff until it succeeds.
+    """
+
+    def __init__(self, service: str, checks=None, warmup=None, warmup_checks=None):
+        self.service = service
+        self.checks = dict(checks or {})
+        self.warmup = warmup
+        self.warmup_checks = dict(warmup_checks or {})
+        self.state = "starting"
+        self.warmup_error = None
+        self.warmup_attempts = 0
+        self._warming = None
+        self._retry = None
+        self._retry_delay = SERVER_WARMUP_RETRY
+
+    def lifespan(self, inner=None):
+        @asynccontextmanager
+        async def lifespan(app):
+            async with inner(app) if inner is not None else nullcontext():
+                if self.warmup is not None and SERVER_WARMUP != "off":
+                    self._start_warmup()
+                    if SERVER_WARMUP == "startup":
+                        try:
+                            await asyncio.shield(self._warming)
+                        except Exception:
+                            # Как и в фоновом режиме: ошибку записал _warmed, воркер стартует и отвечает warmup_failed
+                            pass
+                self.state = "ready"
+                try:
+                    yield
+                finally:
+                    self.state = "stopping"
+                    if self._retry is not None:
+                        self._retry.cancel()
+        return lifespan
+
+    async def endpoint(self, request):
+        checks = self.checks if SERVER_WARMUP == "off" else {**self.warmup_checks, **self.checks}
+        failed = [name for name, check in checks.items() if not check()] if self.state == "ready" else []
+        ready = self.state == "ready" and not failed
+        body = {"service": self.service, "status": "ready" if ready else self.state, "pid": os.getpid()}
+        if failed:
+            body["status"] = "busy"
+            if self._warming is not None and not self._warming.done():
+                body["status"] = "warming"
+            elif self.warmup_error is not None:
+                body["status"] = "warmup_failed"
+                body["error"] = self.warmup_error
+            body["failed"] = failed
+        return JSONResponse(body, status_code=200 if ready else 503)
+
+    def _start_warmup(self):
+        self._retry = None
+        if self.state == "stopping":
+            return
+        self.warmup_attempts += 1
+        self._warming = asyncio.get_running_loop().run_in_executor(None, self.warmup)
+        self._warming.add_done_callback(self._warmed)
+
+    def _warmed(self, future):
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            if self.warmup_error is not None:
+                logger.info("%s warm-up succeeded after %d attempts", self.service, self.warmup_attempts)
+            self.warmup_error = None
+            return
+        # Ошибка прогрева не роняет воркер: проверки держат его вне ротации, пока повторная попытка не удастся
+        self.warmup_error = repr(future.exception())
+        logger.error("%s warm-up failed (attempt %d), retrying in %.0fs", self.service, self.warmup_attempts,
+                     self._retry_delay, exc_info=future.exception())
+        if self.state != "stopping":
+            self._retry = asyncio.get_running_loop().call_later(self._retry_delay, self._start_warmup)
+            self._retry_delay = min(self._retry_delay * 2, SERVER_WARMUP_RETRY_MAX)
+
+    @property
+    def route(self) -> Route:
+        return Route("/ready", self.endpoint, methods=["GET"])
+
+def serve(app, import_path: str, port: int, workers=None):
+    """
+    Run app with uvicorn in `workers` processes (SERVER_WORKERS by default). Workers import import_path
+    ("module:attribute") themselves and each builds its agents in its own warm-up; setup shared across
+    workers must leave an on-disk artifact the rest reuse. With one worker the app is served in this process.
+    """
+    import uvicorn
+    workers = worker_count(SERVER_WORKERS if workers is None else workers)
+    if workers == 1:
+        uvicorn.run(app, host=SERVER_HOST, port=port, timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT)
+    else:
+        uvicorn.run(import_path, host=SERVER_HOST, port=port, workers=workers, timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT)
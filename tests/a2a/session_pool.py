@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+# Настройки пула сессий ADK
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "1000"))
+SESSION_POOL_TTL = float(os.getenv("SESSION_POOL_TTL", "1800"))
+SESSION_POOL_MAX_TURNS = int(os.getenv("SESSION_POOL_MAX_TURNS", "20"))
+
+class _PooledSession:
+    __slots__ = ("session_id", "created", "last_used", "turns", "users", "lock")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.created = False
+        self.last_used = time.monotonic()
+        self.turns = 0
+        self.users = 0
+        self.lock = asyncio.Lock()
+
+class SessionPool:
+    """
+    Hands out ADK sessions for a long-lived Runner.
+
+    Requests without a key get an ephemeral session that is deleted as soon as the request ends.
+    Keyed requests (e.g. an A2A contextId) reuse one session per key; keyed sessions are evicted
+    by LRU once the pool exceeds max_sessions, when idle longer than ttl, and are recycled after
+    max_turns requests so their event history stays bounded.
+    """
+
+    def __init__(self, session_service, app_name, user_id, max_sessions=SESSION_POOL_SIZE,
+                 ttl=SESSION_POOL_TTL, max_turns=SESSION_POOL_MAX_TURNS):
+        self.session_service = session_service
+        self.app_name = app_name
+        self.user_id = user_id
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()  # key -> _PooledSession
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "recycled": 0}
+
+    @asynccontextmanager
+    async def session(self, key=None):
+        if key is None:
+            session_id = await self._create()
+            try:
+                yield session_id
+            finally:
+                await self._delete(session_id)
+            return
+
+        entry, stale = self._acquire(key)
+        try:
+            if stale is not None:
+                await self._delete(stale.session_id)
+            await self._evict()
+            # Один запрос за раз на сессию, чтобы параллельные вызовы не смешивали историю
+            async with entry.lock:
+                await self._ensure(entry)
+                entry.turns += 1
+                yield entry.session_id
+        finally:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _acquire(self, key):
+        # Синхронная часть: до первого await запись уже помечена как занятая
+        stale = None
+        entry = self._sessions.get(key)
+        if entry is not None and entry.turns >= self.max_turns and entry.users == 0:
+            stale = self._sessions.pop(key)
+            self.stats["recycled"] += 1
+            entry = None
+        if entry is None:
+            entry = _PooledSession(uuid.uuid4().hex)
+            self._sessions[key] = entry
+        else:
+            self.stats["reused"] += 1
+        entry.users += 1
+        self._sessions.move_to_end(key)
+        return entry, stale if stale is not None and stale.created else None
+
+    async def _create(self, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        await self.session_service.create_session(app_name=self.app_name, user_id=self.user_id, session_id=session_id)
+        self.stats["created"] += 1
+        return session_id
+
+    async def _ensure(self, entry):
+        # BoundedSessionService может сам вытеснить сессию по LRU/TTL — тогда создаём её заново под тем же id
+        ensure = getattr(self.session_service, "ensure_session", None)
+        if ensure is not None:
+            if await ensure(app_name=self.app_name, user_id=self.user_id, session_id=entry.session_id):
+                self.stats["created"] += 1
+        elif not entry.created:
+            await self._create(entry.session_id)
+        entry.created = True
+
+    async def _delete(self, session_id):
+        await self.session_service.delete_session(app_name=self.app_name, user_id=self.user_id, session_id=session_id)
+
+    async def _evict(self):
+        # Сессии, которые сейчас используются, не трогаем
+        deadline = time.monotonic() - self.ttl
+        victims = []
+        overflow = len(self._sessions) - self.max_sessions
+        for key, entry in self._sessions.items():
+            if entry.users:
+                continue
+            if overflow > 0:
+                overflow -= 1
+            elif entry.last_used > deadline:
+                break
+            victims.append(key)
+        victims = [self._sessions.pop(key) for key in victims]
+        self.stats["evicted"] += len(victims)
+        for entry in victims:
+            if entry.created:
+                await self._delete(entry.session_id)
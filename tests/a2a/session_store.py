@@ -0,0 +1,211 @@
+import copy
+import logging
+import os
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+logger = logging.getLogger(__name__)
+
+# Ограничения хранилища сессий ADK
+ADK_SESSION_MAX = int(os.getenv("ADK_SESSION_MAX", "10000"))
+ADK_SESSION_TTL = float(os.getenv("ADK_SESSION_TTL", "3600"))
+ADK_SESSION_MAX_EVENTS = int(os.getenv("ADK_SESSION_MAX_EVENTS", "50"))
+# События больше этого размера (в байтах JSON) хранятся сжатыми
+ADK_EVENT_COMPRESS_MIN = int(os.getenv("ADK_EVENT_COMPRESS_MIN", "512"))
+
+def _pack(event: Event, compress_min: int) -> bytes:
+    blob = event.model_dump_json(exclude_none=True).encode("utf-8")
+    return zlib.compress(blob) if len(blob) >= compress_min else blob
+
+def _unpack(blob: bytes) -> Event:
+    # JSON всегда начинается с "{", сжатый zlib-поток — нет
+    return Event.model_validate_json(blob if blob[:1] == b"{" else zlib.decompress(blob))
+
+class _StoredSession:
+    __slots__ = ("state", "events", "last_update_time", "last_access")
+
+    def __init__(self, state, last_update_time):
+        self.state = state
+        self.events = []  # [(timestamp, author, blob)]
+        self.last_update_time = last_update_time
+        self.last_access = time.monotonic()
+
+class BoundedSessionService(BaseSessionService):
+    """
+    ADK session service for long-running servers.
+
+    Sessions live in an LRU bounded by max_sessions and expire after ttl seconds without access.
+    Events are kept as compact JSON (zlib above compress_min bytes) and decoded only on get_session;
+    history is trimmed to max_events, cut at a user turn so tool calls never lose their responses.
+    Creation is synchronous inside the coroutine, so a session is visible as soon as create_session returns.
+    """
+
+    def __init__(self, max_sessions=ADK_SESSION_MAX, ttl=ADK_SESSION_TTL, max_events=ADK_SESSION_MAX_EVENTS,
+                 compress_min=ADK_EVENT_COMPRESS_MIN):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_events = max_events
+        self.compress_min = compress_min
+        self._sessions = OrderedDict()  # (app_name, user_id, session_id) -> _StoredSession
+        self._by_user = {}  # (app_name, user_id) -> {session_id}
+        self.app_state = {}
+        self.user_state = {}
+        self.stats = {"created": 0, "hits": 0, "misses": 0, "evicted": 0, "expired": 0, "trimmed_events": 0}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        self._store(app_name, user_id, session_id, state)
+        return self._load(app_name, user_id, session_id, self._sessions[(app_name, user_id, session_id)])
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        stored = self._touch((app_name, user_id, session_id))
+        if stored is None:
+            return None
+        return self._load(app_name, user_id, session_id, stored, config)
+
+    async def get_or_create_session(self, *, app_name: str, user_id: str, session_id: str,
+                                    state: Optional[dict[str, Any]] = None) -> Session:
+        """
+        Existing session or a new one with this id, in one step and without retries.
+        """
+        stored = self._touch((app_name, user_id, session_id))
+        if stored is None:
+            stored = self._store(app_name, user_id, session_id, state)
+        return self._load(app_name, user_id, session_id, stored)
+
+    async def ensure_session(self, *, app_name: str, user_id: str, session_id: str) -> bool:
+        # Как get_or_create_session, но без декодирования истории; True, если сессию пришлось создать
+        if self._touch((app_name, user_id, session_id)) is not None:
+            return False
+        self._store(app_name, user_id, session_id, None)
+        return True
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        self._evict()
+        sessions = []
+        for session_id in list(self._by_user.get((app_name, user_id), ())):
+            stored = self._sessions[(app_name, user_id, session_id)]
+            session = self._load(app_name, user_id, session_id, stored, with_events=False)
+            sessions.append(session)
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._drop((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        session.last_update_time = event.timestamp
+        stored = self._sessions.get((session.app_name, session.user_id, session.id))
+        if stored is None:
+            logger.warning("Failed to append event to session %s: session was evicted", session.id)
+            return event
+
+        if event.actions and event.actions.state_delta:
+            for key, value in event.actions.state_delta.items():
+                if key.startswith(State.TEMP_PREFIX):
+                    continue
+                if key.startswith(State.APP_PREFIX):
+                    self.app_state.setdefault(session.app_name, {})[key.removeprefix(State.APP_PREFIX)] = value
+                elif key.startswith(State.USER_PREFIX):
+                    self.user_state.setdefault((session.app_name, session.user_id), {})[key.removeprefix(State.USER_PREFIX)] = value
+                else:
+                    stored.state[key] = value
+
+        stored.events.append((event.timestamp, event.author, _pack(event, self.compress_min)))
+        stored.last_update_time = event.timestamp
+        if len(stored.events) > self.max_events:
+            self._trim(stored)
+        return event
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "size": len(self._sessions)}
+
+    def _trim(self, stored):
+        # Отрезаем старые события и дальше до начала ближайшего хода пользователя
+        cut = len(stored.events) - self.max_events
+        while cut < len(stored.events) and stored.events[cut][1] != "user":
+            cut += 1
+        if cut >= len(stored.events):
+            return
+        del stored.events[:cut]
+        self.stats["trimmed_events"] += cut
+
+    def _store(self, app_name, user_id, session_id, state):
+        key = (app_name, user_id, session_id)
+        stored = _StoredSession({k: v for k, v in (state or {}).items() if not k.startswith(State.TEMP_PREFIX)}, time.time())
+        self._sessions[key] = stored
+        self._sessions.move_to_end(key)
+        self._by_user.setdefault((app_name, user_id), set()).add(session_id)
+        self.stats["created"] += 1
+        self._evict()
+        return stored
+
+    def _touch(self, key):
+        stored = self._sessions.get(key)
+        if stored is None:
+            self.stats["misses"] += 1
+            return None
+        if time.monotonic() - stored.last_access > self.ttl:
+            self._drop(key)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        stored.last_access = time.monotonic()
+        self._sessions.move_to_end(key)
+        self.stats["hits"] += 1
+        return stored
+
+    def _drop(self, key):
+        if self._sessions.pop(key, None) is None:
+            return
+        sessions = self._by_user.get(key[:2])
+        if sessions is not None:
+            sessions.discard(key[2])
+            if not sessions:
+                del self._by_user[key[:2]]
+
+    def _evict(self):
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            key, stored = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions:
+                self.stats["evicted"] += 1
+            elif stored.last_access < deadline:
+                self.stats["expired"] += 1
+            else:
+                break
+            self._drop(key)
+
+    def _load(self, app_name, user_id, session_id, stored, config=None, with_events=True) -> Session:
+        events = stored.events if with_events else []
+        if config is not None:
+            if config.after_timestamp:
+                events = [e for e in events if e[0] >= config.after_timestamp]
+            if config.num_recent_events:
+                events = events[-config.num_recent_events:]
+        state = copy.deepcopy(stored.state)
+        for key, value in self.app_state.get(app_name, {}).items():
+            state[State.APP_PREFIX + key] = value
+        for key, value in self.user_state.get((app_name, user_id), {}).items():
+            state[State.USER_PREFIX + key] = value
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=state,
+            events=[_unpack(blob) for _, _, blob in events],
+            last_update_time=stored.last_update_time,
+        )
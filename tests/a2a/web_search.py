@@ -1,13 +1,15 @@
 from pydantic_ai import Agent
 from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
+from crawler import fetch_page
 
+# fetch_page читает найденные страницы через общий краулер (тёплый браузер + кэш markdown)
 agent = Agent(
     'openai:o3-mini',
-    tools=[duckduckgo_search_tool()],
-    system_prompt='Search DuckDuckGo for the given query and return the results.',
+    tools=[duckduckgo_search_tool(), fetch_page],
+    system_prompt='Search DuckDuckGo for the given query and return the results. Use fetch_page to read a result page when the snippet is not enough.',
 )
 
 result = agent.run_sync(
     'Can you list the top five highest-grossing animated films of 2025?'
 )
-print(result.output)
\ No newline at end of file
+print(result.output)
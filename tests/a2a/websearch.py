@@ -1,36 +1,104 @@
-import http.client
 import json
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import httpx
 from dotenv import load_dotenv
+from metrics import record_upstream
+from resilience import CircuitBreaker, DeadlineExceeded, budget, copy_deadline, cut_by_deadline
 
 load_dotenv()
 
 SERPER_API_KEY = os.getenv('SERPER_API_KEY')
 SERPER_API_HOST = 'google.serper.dev'
 SERPER_API_PATH = '/search'
+SERPER_BASE_URL = os.getenv('SERPER_BASE_URL', f'https://{SERPER_API_HOST}')
+SERPER_TIMEOUT = float(os.getenv('SERPER_TIMEOUT', '15'))
+SERPER_MAX_CONCURRENCY = int(os.getenv('SERPER_MAX_CONCURRENCY', '16'))
+
+# Один клиент с пулом keep-alive соединений на весь процесс: TLS-рукопожатие только на новое соединение
+_client = None
+_client_lock = threading.Lock()
+# Потоки для search_many тоже общие на процесс; создаются по мере надобности
+_executor = ThreadPoolExecutor(max_workers=SERPER_MAX_CONCURRENCY, thread_name_prefix='serper')
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                base_url=SERPER_BASE_URL,
+                headers={'X-API-KEY': SERPER_API_KEY or '', 'Content-Type': 'application/json'},
+                limits=httpx.Limits(max_connections=SERPER_MAX_CONCURRENCY,
+                                    max_keepalive_connections=SERPER_MAX_CONCURRENCY),
+                timeout=httpx.Timeout(SERPER_TIMEOUT),
+            )
+        return _client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+# Пока Serper сбоит, поиск отказывает сразу (CircuitOpen), не дожидаясь таймаутов
+serper_breaker = CircuitBreaker('serper')
 
 
 def search_serper(query):
-    conn = http.client.HTTPSConnection(SERPER_API_HOST)
-    payload = json.dumps({
-        "q": query
-    })
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
-    conn.request("POST", SERPER_API_PATH, payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-    conn.close()
-    return data.decode("utf-8")
+    # Таймаут не дольше остатка срока запроса, если он задан
+    timeout = budget('serper', SERPER_TIMEOUT)
+    with serper_breaker.guard():
+        try:
+            res = get_client().post(SERPER_API_PATH, json={"q": query}, timeout=timeout)
+        except httpx.TimeoutException:
+            record_upstream('serper', 'timeout')
+            if cut_by_deadline('serper', timeout, SERPER_TIMEOUT):
+                raise DeadlineExceeded('Deadline exceeded while waiting for serper', timeout) from None
+            raise
+        except httpx.HTTPError:
+            record_upstream('serper', 'error')
+            raise
+        record_upstream('serper', 'ok' if res.is_success else 'error')
+        res.raise_for_status()
+    return res.json()
+
+
+def search_many(queries, max_concurrency=SERPER_MAX_CONCURRENCY, return_exceptions=False):
+    """
+    Run many searches concurrently over the shared connection pool, at most max_concurrency at a time.
+    Results come back in the order of queries; with return_exceptions=True a failed query yields its exception.
+    """
+    search = copy_deadline(search_serper)
+
+    def run(query):
+        try:
+            return search(query)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return e
+
+    # Не больше max_concurrency запросов одного вызова в пуле одновременно
+    futures, pending = [], set()
+    for query in queries:
+        if len(pending) >= max_concurrency:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        future = _executor.submit(run, query)
+        futures.append(future)
+        pending.add(future)
+    return [future.result() for future in futures]
 
 
 def main():
     query = input("Enter your search query: ")
     result = search_serper(query)
-    print(result)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,11 +1,16 @@
 import asyncio
+import os
+import sys
 from google.adk.agents import Agent
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.tools import google_search
 from google.genai import types
 import logging
 
+# Ограниченное хранилище сессий живёт в a2a/session_store.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'a2a'))
+from session_store import BoundedSessionService
+
 # Configure logging for more detailed output
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -22,47 +27,31 @@ root_agent = Agent(
 )
 
 # Session and Runner
-session_service = InMemorySessionService()
+session_service = BoundedSessionService()
 
 async def setup_session():
     await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
 
 runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
 
-# Retry Mechanism
-async def get_session(session_service, app_name, user_id, session_id, max_retries=5, delay=0.1):
+async def get_session(session_service, app_name, user_id, session_id):
     """
-    Attempts to retrieve a session, retrying if it's not found.
+    Returns the session, creating it if needed; creation is visible immediately, so no retries are required.
     """
-    for attempt in range(max_retries):
-        try:
-            session = await session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
-            if session is not None:
-                logging.info(f"Session retrieved successfully on attempt {attempt + 1}")
-                return session
-            else:
-                raise ValueError(f"Session not found: {session_id}")
-        except ValueError as e:
-            logging.warning(f"Session not found on attempt {attempt + 1}: {e}")
-            await asyncio.sleep(delay)
-    logging.error("Failed to retrieve session after multiple retries.")
-    return None
+    return await session_service.get_or_create_session(app_name=app_name, user_id=user_id, session_id=session_id)
 
-# Agent Interaction with Retry
+# Agent Interaction
 async def call_agent(query):
     """
-    Helper function to call the agent with session retrieval retry.
+    Helper function to call the agent.
     """
-    session = await get_session(session_service, APP_NAME, USER_ID, SESSION_ID)
-    if session is None:
-        logging.error("Aborting call_agent due to session retrieval failure.")
-        return
+    await get_session(session_service, APP_NAME, USER_ID, SESSION_ID)
 
     content = types.Content(role='user', parts=[types.Part(text=query)])
     try:
-        events = runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
+        events = runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
 
-        for event in events:
+        async for event in events:
             if event.is_final_response():
                 final_response = event.content.parts[0].text
                 print("Agent Response: ", final_response)
@@ -1,14 +1,25 @@
 import asyncio
-from crawl4ai import AsyncWebCrawler
+import os
+import sys
 
-async def main():
-    # Create an instance of AsyncWebCrawler
-    async with AsyncWebCrawler() as crawler:
-        # Run the crawler on a URL
-        result = await crawler.arun(url="https://yandex.ru/maps/org/coffee_boom/39554143272/")
+# Общий краулер с пулом страниц и кэшем живёт в a2a/crawler.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'a2a'))
+from crawler import get_crawler, close_crawler
 
-        # Print the extracted content
-        print(result.markdown)
+async def main():
+    urls = sys.argv[1:] or ["https://yandex.ru/maps/org/coffee_boom/39554143272/"]
+    try:
+        # Один браузер на все URL, страницы грузятся параллельно
+        pages = await get_crawler().crawl_many(urls)
+        for url, page in zip(urls, pages):
+            if isinstance(page, Exception):
+                print(f"{url}: {page}")
+                continue
+            # Print the extracted content
+            print(f"# {url} ({page.source})\n")
+            print(page.markdown)
+    finally:
+        await close_crawler()
 
-# Run the async main function
-asyncio.run(main()) 
+# Run the asynchronous function
+asyncio.run(main())